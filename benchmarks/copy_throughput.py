@@ -0,0 +1,92 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fileops
+
+
+def build_tree(root, small_files, small_size, big_files, big_size, fanout):
+    os.makedirs(root, exist_ok=True)
+    payload = os.urandom(small_size)
+    for index in range(small_files):
+        directory = os.path.join(root, f"d{index % fanout}", f"s{index % (fanout * fanout)}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"small_{index}.bin"), "wb") as f:
+            f.write(payload)
+
+    chunk = os.urandom(1024 * 1024)
+    for index in range(big_files):
+        with open(os.path.join(root, f"big_{index}.bin"), "wb") as f:
+            for _ in range(big_size // len(chunk)):
+                f.write(chunk)
+
+
+def tree_totals(root):
+    file_count, byte_count = 0, 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            file_count += 1
+            byte_count += os.path.getsize(os.path.join(directory, name))
+    return file_count, byte_count
+
+
+def copy_with_shutil(src, dst):
+    shutil.copytree(src, dst)
+
+
+def copy_with_engine(src, dst):
+    fileops.copy_path(src, dst, fileops.Job("copy", src, dst))
+
+
+def best_time(copy, src, scratch, repeat):
+    timings = []
+    for attempt in range(repeat):
+        dst = os.path.join(scratch, f"copy-{copy.__name__}-{attempt}")
+        start = time.perf_counter()
+        copy(src, dst)
+        timings.append(time.perf_counter() - start)
+        shutil.rmtree(dst)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare shutil.copytree with the fileops copy engine.")
+    parser.add_argument("--dir", help="Scratch directory (defaults to a new temporary directory).")
+    parser.add_argument("--small-files", type=int, default=5000)
+    parser.add_argument("--small-size", type=int, default=4096)
+    parser.add_argument("--big-files", type=int, default=4)
+    parser.add_argument("--big-size-mb", type=int, default=256)
+    parser.add_argument("--fanout", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="nlike-fm-copy-", dir=args.dir)
+    try:
+        src = os.path.join(scratch, "src")
+        build_tree(src, args.small_files, args.small_size, args.big_files, args.big_size_mb * 1024 * 1024, args.fanout)
+        file_count, byte_count = tree_totals(src)
+        kernel_methods = ", ".join(name for name, _ in fileops.kernel_copy_methods) or "none"
+
+        print(f"Tree: {file_count} files, {byte_count / 1024 / 1024:.1f} MB in {scratch}")
+        print(f"Kernel copy methods: {kernel_methods}; copy workers: {fileops.COPY_WORKERS}")
+        print(f"{'method':<22}{'seconds':>10}{'MB/s':>10}{'files/s':>12}")
+
+        baseline = None
+        for label, copy in [("shutil.copytree", copy_with_shutil), ("fileops.copy_path", copy_with_engine)]:
+            seconds = best_time(copy, src, scratch, args.repeat)
+            baseline = baseline or seconds
+            print(
+                f"{label:<22}{seconds:>10.3f}{byte_count / 1024 / 1024 / seconds:>10.1f}"
+                f"{file_count / seconds:>12.0f}   x{baseline / seconds:.2f}"
+            )
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import curses
+import os
+import sys
+
+# Run by startup_bench.py in a fresh interpreter: starts nlike-fm.py the way
+# the command line does, writes a line to stdout as soon as the first frame
+# is drawn, then presses ESC. Only what the app itself needs is imported
+# here, so the measured time is the app's.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FirstFrameScreen:
+    def __init__(self, height=40, width=120):
+        self.height = height
+        self.width = width
+        self.drawn = False
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, y, x, text, attr=0):
+        pass
+
+    def move(self, y, x):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def erase(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def noutrefresh(self):
+        if not self.drawn:
+            self.drawn = True
+            sys.stdout.write("frame\n")
+            sys.stdout.flush()
+            # Ends the part of -X importtime output that delayed the frame.
+            sys.stderr.write("first frame\n")
+            sys.stderr.flush()
+
+    def timeout(self, delay):
+        pass
+
+    def getch(self):
+        return 27
+
+
+def main():
+    # These need initscr(), which would take over the terminal.
+    for name in ["curs_set", "start_color", "use_default_colors", "init_pair", "doupdate"]:
+        setattr(curses, name, lambda *args: None)
+    curses.color_pair = lambda pair: pair << 8
+
+    path = os.path.join(ROOT, "nlike-fm.py")
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    # Compiled like a script is, never from a cached .pyc.
+    app = {"__name__": "nlike_fm", "__file__": path}
+    exec(compile(source, path, "exec"), app)
+    app["main"](FirstFrameScreen(), [sys.argv[1] if len(sys.argv) > 1 else os.getcwd()])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+CHILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "first_frame.py")
+# Median warm time to first frame, interpreter start included, above which
+# the run fails.
+DEFAULT_BUDGET_MS = 100
+
+
+def time_to_first_frame(directory, pycache, scratch, options=()):
+    # Wall time from spawning the interpreter until the app has drawn its
+    # first frame. Returns it with whatever the child wrote to stderr.
+    environment = dict(os.environ)
+    # Warm runs rely on the bytecode cache being written.
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, *options, "-X", f"pycache_prefix={pycache}", CHILD, directory],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=scratch,
+        env=environment,
+        text=True,
+    )
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - start
+    _, errors = process.communicate()
+    if line.strip() != "frame":
+        raise RuntimeError(f"first_frame.py did not draw a frame:\n{errors}")
+    return elapsed, errors
+
+
+def import_times(errors, top):
+    # Parses -X importtime output into (cumulative ms, module) for the
+    # modules imported directly by the app or the child before the first
+    # frame, slowest first.
+    imports = []
+    for line in errors.splitlines():
+        if line == "first frame":
+            break
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            imports.append((int(cumulative) / 1000, name.strip()))
+    imports.sort(reverse=True)
+    return imports[:top]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min_ms": round(timings[0] * 1000, 1),
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "max_ms": round(timings[-1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the time nlike-fm.py takes to draw its first frame.")
+    parser.add_argument("--dir", default=os.getcwd(), help="Directory the app opens (defaults to the current one).")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="nlike-fm-startup-")
+    try:
+        # Cold runs get an empty bytecode cache each, so every module is
+        # compiled from source as on the first launch after an install.
+        cold = []
+        for attempt in range(args.repeat):
+            pycache = os.path.join(scratch, f"cold-{attempt}")
+            cold.append(time_to_first_frame(args.dir, pycache, scratch)[0])
+
+        warm_cache = os.path.join(scratch, "warm")
+        time_to_first_frame(args.dir, warm_cache, scratch)
+        warm = [time_to_first_frame(args.dir, warm_cache, scratch)[0] for _ in range(args.repeat)]
+        _, errors = time_to_first_frame(args.dir, warm_cache, scratch, ["-X", "importtime"])
+        imports = import_times(errors, args.top)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    results = {"cold": summarize(cold), "warm": summarize(warm)}
+    for label, result in results.items():
+        print(
+            f"{label:<5} first frame: median {result['median_ms']:.1f} ms "
+            f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f}) over {result['runs']} runs"
+        )
+    print(f"\nSlowest imports (warm, cumulative):")
+    for milliseconds, name in imports:
+        print(f"{milliseconds:>8.1f} ms  {name}")
+
+    if args.json:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "budget_ms": args.budget_ms,
+            "results": results,
+            "imports": [{"module": name, "cumulative_ms": milliseconds} for milliseconds, name in imports],
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if results["warm"]["median_ms"] > args.budget_ms:
+        print(f"\nOver budget: warm median {results['warm']['median_ms']:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+import argparse
+import curses
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fileindex
+import fileops
+import listing
+import search
+
+
+# Deep trees give every directory this many files and subdirectories, so a
+# million entries end up about fifteen levels down. Wide trees put everything
+# in one directory, with one entry in a hundred being a folder.
+DEEP_FILES_PER_DIR = 10
+DEEP_SUBDIRS_PER_DIR = 2
+WIDE_DIR_EVERY = 100
+SMALL_FILE_BYTES = 512
+SCREEN_HEIGHT = 50
+SCREEN_WIDTH = 160
+
+
+class HeadlessScreen:
+    # Just enough of a curses window for the drawing code, without a terminal.
+
+    def __init__(self, height=SCREEN_HEIGHT, width=SCREEN_WIDTH):
+        self.height = height
+        self.width = width
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, y, x, text, attr=0):
+        pass
+
+    def addnstr(self, y, x, text, length, attr=0):
+        pass
+
+    def erase(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+
+def load_app():
+    # nlike-fm.py is not importable by name. color_pair() needs initscr(),
+    # so it is replaced with the plain pair-number shift curses uses.
+    curses.color_pair = lambda pair: pair << 8
+    spec = importlib.util.spec_from_file_location("nlike_fm", os.path.join(ROOT, "nlike-fm.py"))
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+def write_file(path, size=SMALL_FILE_BYTES):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+
+
+def build_tree(root, entries, shape, huge_files, huge_size):
+    # File names carry a global counter, so files from anywhere in the tree
+    # can be pasted into one folder without clashing.
+    os.makedirs(root)
+    count = 0
+    if shape == "wide":
+        while count < entries:
+            path = os.path.join(root, f"entry_{count:07}")
+            if count % WIDE_DIR_EVERY == 0:
+                os.mkdir(path)
+            else:
+                write_file(path + ".txt")
+            count += 1
+    else:
+        pending = [root]
+        while pending and count < entries:
+            directory = pending.pop(0)
+            for _ in range(DEEP_FILES_PER_DIR):
+                if count >= entries:
+                    break
+                write_file(os.path.join(directory, f"entry_{count:07}.txt"))
+                count += 1
+            for _ in range(DEEP_SUBDIRS_PER_DIR):
+                if count >= entries:
+                    break
+                path = os.path.join(directory, f"dir_{count:07}")
+                os.mkdir(path)
+                pending.append(path)
+                count += 1
+
+    # Huge files are sparse, so building them costs nothing.
+    for index in range(huge_files):
+        with open(os.path.join(root, f"huge_{index}.bin"), "wb") as f:
+            f.truncate(huge_size)
+
+
+def largest_directory(root):
+    best, best_count = root, -1
+    for directory, dirs, files in os.walk(root):
+        if len(dirs) + len(files) > best_count:
+            best, best_count = directory, len(dirs) + len(files)
+    return best
+
+
+def sample_files(root, limit):
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.startswith("huge_"):
+                continue
+            paths.append(os.path.join(directory, name))
+            if len(paths) >= limit:
+                return paths
+    return paths
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_timings, fraction):
+    if not sorted_timings:
+        return 0.0
+    index = min(len(sorted_timings) - 1, int(fraction * len(sorted_timings)))
+    return sorted_timings[index]
+
+
+def summarize(shape, entries, operation, timings, ops=None):
+    # `timings` holds one latency per call; `ops` counts what those calls
+    # processed in total (files copied, entries walked) when it is not one
+    # per call.
+    timings = sorted(timings)
+    total = sum(timings)
+    ops = len(timings) if ops is None else ops
+    return {
+        "shape": shape,
+        "entries": entries,
+        "operation": operation,
+        "calls": len(timings),
+        "ops": ops,
+        "seconds": round(total, 6),
+        "ops_per_sec": round(ops / total, 1) if total else None,
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3) if timings else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def wait_for_listing(app, directory):
+    while app.listing_cache.loading(directory) is not None:
+        time.sleep(0.001)
+
+
+def bench_list_files(app, shape, entries, directory, repeat):
+    first_frame, complete, warm = [], [], []
+    for _ in range(repeat):
+        app.listing_cache.invalidate()
+        start = time.perf_counter()
+        app.list_files(directory)
+        first_frame.append(time.perf_counter() - start)
+        wait_for_listing(app, directory)
+        complete.append(time.perf_counter() - start)
+        warm.append(timed(app.list_files, directory)[0])
+    return [
+        summarize(shape, entries, "list_files first frame", first_frame),
+        summarize(shape, entries, "list_files complete", complete),
+        summarize(shape, entries, "list_files cached", warm),
+    ]
+
+
+def bench_file_info(app, shape, entries, directory, repeat):
+    files, _ = app.list_files(directory)
+    visible = [os.path.join(directory, files[index]) for index in range(min(len(files), SCREEN_HEIGHT))]
+    cold, warm = [], []
+    for _ in range(repeat):
+        app.stat_cache.invalidate()
+        app.stat_cache.refresh()
+        cold.extend(timed(app.get_file_info, path)[0] for path in visible)
+        app.stat_cache.refresh()
+        warm.extend(timed(app.get_file_info, path)[0] for path in visible)
+    return [
+        summarize(shape, entries, "get_file_info cold", cold),
+        summarize(shape, entries, "get_file_info cached", warm),
+    ]
+
+
+def bench_display_files(app, shape, entries, directory, frames):
+    # Redraws the listing at `frames` points spread over its whole length.
+    files, _ = app.list_files(directory)
+    screen = HeadlessScreen()
+    max_height = SCREEN_HEIGHT - 3
+    step = max(1, len(files) // frames)
+    timings = []
+    scroll_offset = 0
+    for current_index in range(0, max(1, len(files)), step):
+        app.stat_cache.refresh()
+        elapsed, scroll_offset = timed(
+            app.display_files, screen, files, current_index, max_height, directory, scroll_offset
+        )
+        timings.append(elapsed)
+    return [summarize(shape, entries, "display_files frame", timings)]
+
+
+def run_search(root, query):
+    job = search.SearchJob(root, query, limit=5000).start()
+    while not job.done:
+        time.sleep(0.001)
+    if job.error:
+        raise job.error
+    return job
+
+
+def bench_search(shape, entries, root, repeat):
+    cold, warm = [], []
+    for _ in range(repeat):
+        # A cold search walks the tree and builds the index from scratch.
+        fileindex._indexes.clear()
+        shutil.rmtree(fileindex.cache_dir("index"), ignore_errors=True)
+        cold.append(timed(run_search, root, "entry_00001")[0])
+        warm.append(timed(run_search, root, "entry_00002")[0])
+    return [
+        summarize(shape, entries, "search walk cold", cold, ops=entries * len(cold)),
+        summarize(shape, entries, "search warm", warm),
+    ]
+
+
+def bench_paste_delete(shape, entries, root, scratch, paste_files, repeat):
+    sources = sample_files(root, paste_files)
+    paste, delete = [], []
+    for attempt in range(repeat):
+        target = os.path.join(scratch, f"paste-{attempt}")
+        os.makedirs(target)
+        items = [(src, os.path.join(target, os.path.basename(src))) for src in sources]
+        job = fileops.Job("copy", None, items=items)
+        paste.append(timed(fileops.run_job, job)[0])
+        if job.error:
+            raise job.error
+        job = fileops.Job("delete", None, items=[(dst, None) for _, dst in items])
+        delete.append(timed(fileops.run_job, job)[0])
+        if job.error:
+            raise job.error
+        os.rmdir(target)
+    return [
+        summarize(shape, entries, "paste batch", paste, ops=len(sources) * len(paste)),
+        summarize(shape, entries, "delete batch", delete, ops=len(sources) * len(delete)),
+    ]
+
+
+def print_results(results, baseline=None):
+    previous = {}
+    for result in baseline or []:
+        previous[(result["shape"], result["entries"], result["operation"])] = result
+
+    print(f"{'shape':<6}{'entries':>9}  {'operation':<24}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    for result in results:
+        line = (
+            f"{result['shape']:<6}{result['entries']:>9}  {result['operation']:<24}"
+            f"{result['ops_per_sec'] or 0:>12.1f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+            f"{result['p99_ms']:>10.3f}{result['peak_rss_mb'] or 0:>9.1f}"
+        )
+        before = previous.get((result["shape"], result["entries"], result["operation"]))
+        if before and before["ops_per_sec"] and result["ops_per_sec"]:
+            line += f"   x{result['ops_per_sec'] / before['ops_per_sec']:.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure listing, drawing, search and paste on synthetic trees.")
+    parser.add_argument("--dir", help="Scratch directory (defaults to a new temporary directory).")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated entry counts, e.g. 10000,100000,1000000.")
+    parser.add_argument("--shapes", default="deep,wide", help="Comma-separated tree shapes: deep, wide.")
+    parser.add_argument("--huge-files", type=int, default=2)
+    parser.add_argument("--huge-size-mb", type=int, default=1024)
+    parser.add_argument("--paste-files", type=int, default=2000)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--compare", help="Results file of an earlier run to compare against.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    scratch = tempfile.mkdtemp(prefix="nlike-fm-bench-", dir=args.dir)
+    # Keeps the search index and the app's log file out of the user's cache
+    # and the working directory.
+    os.environ["XDG_CACHE_HOME"] = os.path.join(scratch, "cache")
+    os.environ.pop("LOCALAPPDATA", None)
+    cwd = os.getcwd()
+    os.chdir(scratch)
+    try:
+        app = load_app()
+        results = []
+        for entries in [int(size) for size in args.sizes.split(",")]:
+            for shape in args.shapes.split(","):
+                root = os.path.join(scratch, f"{shape}-{entries}")
+                print(f"Building {shape} tree of {entries} entries...", file=sys.stderr)
+                build_tree(root, entries, shape, args.huge_files, args.huge_size_mb * 1024 * 1024)
+                # Listings younger than this are never trusted from cache.
+                time.sleep(listing.RACY_WINDOW_NS / 1e9)
+                directory = largest_directory(root)
+
+                results += bench_list_files(app, shape, entries, directory, args.repeat)
+                results += bench_file_info(app, shape, entries, directory, args.repeat)
+                results += bench_display_files(app, shape, entries, directory, args.frames)
+                results += bench_search(shape, entries, root, args.repeat)
+                results += bench_paste_delete(shape, entries, root, scratch, args.paste_files, args.repeat)
+
+                app.listing_cache.invalidate()
+                app.stat_cache.invalidate()
+                shutil.rmtree(root)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print_results(results, baseline)
+    if args.json:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
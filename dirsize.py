@@ -0,0 +1,210 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+SIZE_CACHE_ENTRIES = 200_000
+
+
+class SizeCache:
+    # path -> (mtime_ns, total_bytes, file_count, dir_count) for whole
+    # subtrees. An entry is reused as long as the directory's own mtime is
+    # unchanged, the same trade-off `du`-style tools make.
+
+    def __init__(self, max_entries=SIZE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._totals = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path, mtime_ns):
+        with self._lock:
+            cached = self._totals.get(path)
+            if cached is None or cached[0] != mtime_ns:
+                self.misses += 1
+                return None
+            self._totals.move_to_end(path)
+            self.hits += 1
+            return cached
+
+    def get(self, path):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        return self.lookup(path, mtime_ns)
+
+    def store(self, path, mtime_ns, total_bytes, file_count, dir_count):
+        with self._lock:
+            self._totals[path] = (mtime_ns, total_bytes, file_count, dir_count)
+            self._totals.move_to_end(path)
+            while len(self._totals) > self.max_entries:
+                self._totals.popitem(last=False)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._totals.clear()
+                return
+            # A change anywhere below a directory also changes its total.
+            path = os.path.abspath(path)
+            while True:
+                self._totals.pop(path, None)
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+
+class SizeJob:
+    def __init__(self, cache, path, workers=None):
+        self.cache = cache
+        self.path = os.path.abspath(path)
+        self.workers = workers
+        self.total_bytes = 0
+        self.file_count = 0
+        self.dir_count = 0
+        self.done = False
+        self.complete = False
+        self.error = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _scan(self, relpath, path):
+        mtime_ns = None
+        own_bytes, own_files = 0, 0
+        reused = [0, 0, 0]
+        walk_subdirs = []
+
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            info = entry.stat(follow_symlinks=False)
+                            cached = self.cache.lookup(entry.path, info.st_mtime_ns)
+                            if cached is None:
+                                walk_subdirs.append(entry.name)
+                            else:
+                                reused[0] += cached[1]
+                                reused[1] += cached[2]
+                                reused[2] += cached[3] + 1
+                        else:
+                            own_bytes += entry.stat(follow_symlinks=False).st_size
+                            own_files += 1
+                    except OSError:
+                        continue
+        except OSError as e:
+            # An unreadable folder counts as an empty one, so the totals
+            # above it can still complete and be cached.
+            if self.error is None:
+                self.error = e
+            own_bytes, own_files, reused, walk_subdirs = 0, 0, [0, 0, 0], []
+
+        with self._lock:
+            self.total_bytes += own_bytes + reused[0]
+            self.file_count += own_files + reused[1]
+            self.dir_count += len(walk_subdirs) + reused[2]
+        return (mtime_ns, own_bytes, own_files, walk_subdirs, reused), walk_subdirs
+
+    def _run(self):
+        # Subdirectories with a valid cached total are not descended into; the
+        # rest are walked in parallel and summed bottom-up afterwards. Each
+        # finished subtree is cached, so a cancelled run still leaves behind
+        # everything it fully counted.
+        # walker pulls in concurrent.futures, and through it logging, so it
+        # is imported here, on the sizer's own thread.
+        import walker
+
+        nodes = {}
+        try:
+            for relpath, node in walker.walk(self.path, self._scan, self.workers, self._cancelled):
+                nodes[relpath] = node
+        except Exception as e:
+            self.error = e
+
+        totals = {}
+        for relpath in sorted(nodes, key=lambda p: p.count(os.sep) + bool(p), reverse=True):
+            mtime_ns, own_bytes, own_files, walk_subdirs, reused = nodes[relpath]
+            total = [own_bytes + reused[0], own_files + reused[1], len(walk_subdirs) + reused[2]]
+            complete = True
+            for name in walk_subdirs:
+                child = totals.get(os.path.join(relpath, name))
+                if child is None:
+                    complete = False
+                    break
+                total[0] += child[0]
+                total[1] += child[1]
+                total[2] += child[2]
+            if complete:
+                totals[relpath] = total
+                self.cache.store(os.path.join(self.path, relpath) if relpath else self.path, mtime_ns, *total)
+
+        if "" in totals:
+            self.total_bytes, self.file_count, self.dir_count = totals[""]
+            self.complete = True
+        self.done = True
+
+
+class DirSizer:
+    # Keeps at most one SizeJob running, for whichever directory is selected.
+
+    def __init__(self, cache=None):
+        self.cache = cache or SizeCache()
+        self.job = None
+
+    def request(self, path, mtime_ns=None):
+        # Returns (total_bytes, complete) for path, starting a background
+        # computation when the cached total is missing or stale. Callers that
+        # have already stat'ed the directory pass its mtime along.
+        path = os.path.abspath(path)
+        cached = self.cache.get(path) if mtime_ns is None else self.cache.lookup(path, mtime_ns)
+        if cached is not None:
+            self.cancel()
+            return cached[1], True
+
+        # A finished, complete job whose result is no longer in the cache
+        # means the directory changed since, so it is counted again. One that
+        # finished without completing (its walk failed) only has a partial
+        # total, which is shown as such rather than retried every frame.
+        if self.job is not None and self.job.path == path and not (self.job.done and self.job.complete):
+            return self.job.total_bytes, self.job.complete
+
+        self.cancel()
+        self.job = SizeJob(self.cache, path).start()
+        return 0, False
+
+    def follow(self, path):
+        # Called with the highlighted entry every frame, so a count for a
+        # folder the cursor has left stops even when it moved onto a file.
+        if self.job is not None and (path is None or self.job.path != os.path.abspath(path)):
+            self.cancel()
+
+    def take_error(self):
+        # Returns the error of a finished job once, for the caller to log.
+        if self.job is None or not self.job.done or self.job.error is None:
+            return None
+        error, self.job.error = self.job.error, None
+        return error
+
+    def busy(self):
+        return self.job is not None and not self.job.done
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
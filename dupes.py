@@ -0,0 +1,278 @@
+import fnmatch
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import walker
+from fileindex import cache_dir
+from listing import RACY_WINDOW_NS
+
+
+CACHE_VERSION = 2
+# The first pass hashes this much at each end of a file. Files no longer
+# than twice this are then hashed whole and skip the second pass.
+EDGE_BYTES = 4096
+READ_BYTES = 1024 * 1024
+# hashlib lets go of the GIL while it digests, so threads hash on every core.
+HASH_WORKERS = os.cpu_count() or 1
+# Digests of this many files are kept on disk; the least recently used go.
+# The whole cache is loaded and rewritten, so it is kept to a few MB.
+CACHE_ENTRIES = 200_000
+# 128-bit digests: collisions stay out of reach while entries stay small.
+DIGEST_BYTES = 16
+IGNORE = [".git", ".hg", ".svn", ".nlike-fm-*"]
+
+EDGE, FULL = 0, 1
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def edge_digest(path, size):
+    with open(path, "rb") as f:
+        digest = hashlib.blake2b(f.read(EDGE_BYTES), digest_size=DIGEST_BYTES)
+        if size > EDGE_BYTES:
+            f.seek(max(EDGE_BYTES, size - EDGE_BYTES))
+            digest.update(f.read(EDGE_BYTES))
+    return digest.digest()
+
+
+def full_digest(path, cancelled=None):
+    # Returns None if cancelled partway through.
+    digest = hashlib.blake2b(digest_size=DIGEST_BYTES)
+    buffer = bytearray(READ_BYTES)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                return None
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.digest()
+
+
+class HashCache:
+    # (device, inode, size, mtime_ns) -> [edge digest, full digest], so a
+    # rerun only reads files that changed. Where the filesystem has no inode
+    # numbers the path stands in for (device, inode). Files changed too
+    # recently for their mtime to be trusted are not cached, as in the
+    # search index.
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.file_path = os.path.join(cache_dir(), "hashes.cache")
+        self.entries = {}
+        self.changed = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.file_path, "rb") as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            return False
+        if version != CACHE_VERSION:
+            return False
+        self.entries = entries
+        return True
+
+    def save(self):
+        with self.lock:
+            if not self.changed:
+                return
+            # Entries are moved to the end when used, so the oldest go first.
+            for key in list(self.entries)[: max(0, len(self.entries) - self.max_entries)]:
+                del self.entries[key]
+            temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump((CACHE_VERSION, self.entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.file_path)
+            self.changed = False
+
+    def get(self, key, kind):
+        with self.lock:
+            digests = self.entries.pop(key, None)
+            if digests is None:
+                return None
+            self.entries[key] = digests
+            return digests[kind]
+
+    def put(self, key, kind, digest):
+        with self.lock:
+            digests = self.entries.pop(key, None) or [None, None]
+            digests[kind] = digest
+            self.entries[key] = digests
+            self.changed = True
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HashCache()
+            _cache.load()
+    return _cache
+
+
+class GroupRows(list):
+    # Display rows of the duplicate view: each group's heading, then its
+    # files. `paths` holds the file of every row and None for headings,
+    # which the file list colors like folders.
+    def __init__(self):
+        super().__init__()
+        self.paths = []
+        self.wasted_bytes = 0
+
+    def add(self, label, path=None):
+        self.append(label)
+        self.paths.append(path)
+
+    def is_dir_at(self, position):
+        return self.paths[position] is None
+
+
+class DuplicateJob:
+    # Finds files with the same content under root on a background thread.
+    # Each pass only looks at files the one before left in a group of two
+    # or more: the walk groups files by size, then a hash of their first and
+    # last EDGE_BYTES splits the groups, and only what is left is read whole.
+    # Hard links to one file count once, since deleting one frees nothing.
+    # `groups` is filled in at the end as (size, paths) pairs, the most
+    # space wasted first.
+
+    def __init__(self, root, workers=None, ignore=IGNORE):
+        self.root = os.path.abspath(root)
+        self.workers = workers or HASH_WORKERS
+        self.ignored = re.compile("|".join(fnmatch.translate(pattern) for pattern in ignore)) if ignore else None
+        # The app's own caches, trash included, are never duplicates to report.
+        self.skipped = {cache_dir()}
+        self.cache = None
+        self.stage = "scanning"
+        self.files_seen = 0
+        self.checked = 0
+        self.to_check = 0
+        self.bytes_hashed = 0
+        self.bytes_to_hash = 0
+        self.groups = []
+        self.wasted_bytes = 0
+        self.done = False
+        self.error = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _scan(self, relpath, path):
+        with os.scandir(path) as entries:
+            entries = list(entries)
+        files, subdirs = [], []
+        for entry in entries:
+            if self.ignored is not None and self.ignored.match(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in self.skipped:
+                        subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_size > 0:
+                        identity = (st.st_dev, st.st_ino) if st.st_ino else (entry.path,)
+                        files.append((entry.path, st.st_size, identity + (st.st_size, st.st_mtime_ns)))
+            except OSError:
+                continue
+        with self._lock:
+            self.files_seen += len(files)
+        return files, subdirs
+
+    def _digest(self, member, kind):
+        path, size, key = member
+        if self._cancelled.is_set():
+            return None
+        digest = self.cache.get(key, kind)
+        if digest is None:
+            started_ns = time.time_ns()
+            try:
+                digest = edge_digest(path, size) if kind == EDGE else full_digest(path, self._cancelled)
+            except OSError:
+                digest = None
+            if digest is not None and started_ns - key[-1] >= RACY_WINDOW_NS:
+                self.cache.put(key, kind, digest)
+        with self._lock:
+            self.checked += 1
+            if kind == FULL:
+                self.bytes_hashed += size
+        return digest
+
+    def _split(self, groups, kind):
+        # Splits each group by the digest of every member; members that
+        # could not be read and groups left with one member are dropped.
+        members = [member for group in groups for member in group]
+        self.checked, self.to_check = 0, len(members)
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="hasher") as pool:
+            digests = iter(list(pool.map(lambda member: self._digest(member, kind), members)))
+        split_groups = []
+        for group in groups:
+            by_digest = defaultdict(list)
+            for member in group:
+                digest = next(digests)
+                if digest is not None:
+                    by_digest[digest].append(member)
+            split_groups.extend(same for same in by_digest.values() if len(same) > 1)
+        return split_groups
+
+    def _run(self):
+        try:
+            by_size = defaultdict(list)
+            seen = set()
+            for _, files in walker.walk(self.root, self._scan, cancelled=self._cancelled):
+                for path, size, key in files:
+                    if key[:-2] in seen:
+                        continue
+                    seen.add(key[:-2])
+                    by_size[size].append((path, size, key))
+            if self._cancelled.is_set():
+                return
+
+            self.cache = get_cache()
+            self.stage = "comparing"
+            groups = self._split([group for group in by_size.values() if len(group) > 1], EDGE)
+            # Small files were hashed whole by the first pass.
+            final = [group for group in groups if group[0][1] <= 2 * EDGE_BYTES]
+            rest = [group for group in groups if group[0][1] > 2 * EDGE_BYTES]
+            if not self._cancelled.is_set():
+                self.stage = "hashing"
+                self.bytes_to_hash = sum(size for group in rest for _, size, _ in group)
+                final += self._split(rest, FULL)
+            if self._cancelled.is_set():
+                return
+
+            final.sort(key=lambda group: group[0][1] * (len(group) - 1), reverse=True)
+            self.groups = [(group[0][1], sorted(path for path, _, _ in group)) for group in final]
+            self.wasted_bytes = sum(size * (len(paths) - 1) for size, paths in self.groups)
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.cache is not None:
+                try:
+                    self.cache.save()
+                except OSError as e:
+                    if self.error is None:
+                        self.error = e
+            self.done = True
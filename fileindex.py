@@ -0,0 +1,190 @@
+import bisect
+import fnmatch
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+
+import walker
+from listing import RACY_WINDOW_NS
+
+
+INDEX_VERSION = 2
+# Names left out of the index, and folders not descended into: the trash
+# and overwrite snapshots kept by fileops.
+IGNORE = [".nlike-fm-*"]
+IGNORED = re.compile("|".join(fnmatch.translate(pattern) for pattern in IGNORE))
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def cache_dir(*parts):
+    base = (
+        os.environ.get("LOCALAPPDATA")
+        or os.environ.get("XDG_CACHE_HOME")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    path = os.path.join(base, "nlike-fm", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def scan_directory(path):
+    names, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if IGNORED.match(entry.name):
+                continue
+            names.append(entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+            except OSError:
+                continue
+    names.sort()
+    subdirs.sort()
+    return tuple(names), tuple(subdirs)
+
+
+class FileIndex:
+    # Every directory under root is stored as
+    #   relpath -> (mtime_ns, listed_ns, names, subdirs)
+    # so an update only has to stat each directory and rescan the ones whose
+    # mtime moved. Names are searched through one newline-joined lowercase
+    # blob, which keeps queries in C string code instead of a Python loop.
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.dirs = {}
+        self.lock = threading.Lock()
+        self.file_path = os.path.join(
+            cache_dir("index"),
+            hashlib.sha1(self.root.encode("utf-8", "surrogateescape")).hexdigest() + ".idx",
+        )
+        self._paths = None
+        self._blob = None
+        self._offsets = None
+
+    def load(self):
+        try:
+            with open(self.file_path, "rb") as f:
+                version, root, dirs = pickle.load(f)
+        except Exception:
+            return False
+        if version != INDEX_VERSION or root != self.root:
+            return False
+        self.dirs = dirs
+        self._paths = None
+        return True
+
+    def save(self):
+        temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump((INDEX_VERSION, self.root, self.dirs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.file_path)
+
+    def update(self, visit=None, cancelled=None, workers=None):
+        # visit(relpath, names) is called from the walker's worker threads.
+        previous = self.dirs
+
+        def scan(relpath, path):
+            mtime_ns = os.stat(path).st_mtime_ns
+            cached = previous.get(relpath)
+            if cached is not None and cached[0] == mtime_ns and cached[1] - mtime_ns >= RACY_WINDOW_NS:
+                entry, rescanned = cached, False
+            else:
+                names, subdirs = scan_directory(path)
+                entry, rescanned = (mtime_ns, time.time_ns(), names, subdirs), True
+            if visit is not None:
+                visit(relpath, entry[2])
+            return (entry, rescanned), entry[3]
+
+        fresh = {}
+        rescanned = 0
+        for relpath, (entry, was_rescanned) in walker.walk(self.root, scan, workers, cancelled):
+            fresh[relpath] = entry
+            rescanned += was_rescanned
+
+        if cancelled is not None and cancelled.is_set():
+            # Keep what was rescanned so far; directories not reached yet
+            # stay as they were and get checked again next time.
+            if rescanned:
+                self.dirs = {**previous, **fresh}
+                self._paths = None
+            return rescanned > 0
+
+        changed = rescanned > 0 or len(fresh) != len(previous)
+        self.dirs = fresh
+        if changed:
+            self._paths = None
+        return changed
+
+    def _build(self):
+        paths, names = [], []
+        stack = [""]
+        while stack:
+            relpath = stack.pop()
+            entry = self.dirs.get(relpath)
+            if entry is None:
+                continue
+            for name in entry[2]:
+                paths.append((relpath, name))
+                names.append(name.lower())
+            stack.extend(os.path.join(relpath, name) for name in reversed(entry[3]))
+
+        offsets, position = [], 1
+        for name in names:
+            offsets.append(position)
+            position += len(name) + 1
+
+        self._paths = paths
+        self._blob = "\n" + "\n".join(names) + "\n"
+        self._offsets = offsets
+
+    def relative_paths(self):
+        # Every entry as a path relative to root, and for each the mtime of
+        # the directory it is in.
+        paths, mtimes = [], []
+        for relpath, (mtime_ns, _, names, _) in self.dirs.items():
+            prefix = relpath + os.sep if relpath else ""
+            paths.extend([prefix + name for name in names])
+            mtimes.extend([mtime_ns] * len(names))
+        return paths, mtimes
+
+    def search(self, query):
+        parts = query.lower().split()
+        if not parts:
+            return []
+        if self._paths is None:
+            self._build()
+
+        # Scan the blob for the most selective (longest) part, then check
+        # the remaining parts only against the names that survived.
+        parts.sort(key=len, reverse=True)
+        first, rest = parts[0], parts[1:]
+        blob, offsets = self._blob, self._offsets
+
+        matches = []
+        position = blob.find(first)
+        while position != -1:
+            index = bisect.bisect_right(offsets, position) - 1
+            end = blob.index("\n", position)
+            if all(part in blob[offsets[index] : end] for part in rest):
+                matches.append(index)
+            position = blob.find(first, end)
+
+        return [os.path.join(self.root, relpath, name) for relpath, name in (self._paths[i] for i in matches)]
+
+
+def get_index(root):
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = FileIndex(root)
+            index.load()
+            _indexes[root] = index
+    return index
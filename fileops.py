@@ -0,0 +1,711 @@
+import errno
+import os
+import tempfile
+import queue
+import shutil
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fileindex
+import walker
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+COPY_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+COPY_IN_FLIGHT = COPY_WORKERS * 64
+
+# errnos meaning "this kernel or filesystem can't do that", after which the
+# copy carries on from the same offset with the next, simpler method.
+KERNEL_COPY_UNSUPPORTED = {
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.EBADF,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+}
+
+kernel_copy_methods = []
+if hasattr(os, "copy_file_range"):
+    kernel_copy_methods.append(("copy_file_range", lambda infd, outfd, count: os.copy_file_range(infd, outfd, count)))
+if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    kernel_copy_methods.append(("sendfile", lambda infd, outfd, count: os.sendfile(outfd, infd, None, count)))
+
+# Names of the methods above that returned ENOSYS. Copy threads only ever
+# add to this set, so it needs no lock, unlike removing from the list.
+disabled_kernel_copy_methods = set()
+
+# Linux FICLONE ioctl: share the source's extents copy-on-write (btrfs, XFS).
+FICLONE = 0x40049409
+CLONE_UNSUPPORTED = KERNEL_COPY_UNSUPPORTED | {errno.ENOTTY, errno.EPERM}
+LINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.EEXIST}
+
+# "reflink" clones where the filesystem allows it and copies bytes otherwise;
+# "hardlink" additionally tries a hard link when cloning fails, before
+# copying, so the pasted file shares its data (and later edits) with the
+# original; "off" always copies bytes.
+FAST_COPY_MODES = ("reflink", "hardlink", "off")
+
+JOB_LABELS = {"copy": "Copying", "move": "Moving", "delete": "Deleting", "restore": "Restoring"}
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # One copy, move or delete. Worker threads update the counters; the UI
+    # thread only reads them, and applies `record` to the undo/redo stacks
+    # once the job reports "done".
+
+    def __init__(
+        self,
+        kind,
+        src,
+        dst=None,
+        overwrite=False,
+        record=None,
+        failure_message=None,
+        fast_copy="reflink",
+        backup=None,
+        displace_to=None,
+        items=None,
+    ):
+        self.kind = kind
+        self.src = src
+        self.dst = dst
+        # A batch job works on (src, dst) pairs instead of src and dst;
+        # delete batches leave dst as None.
+        self.items = items
+        self.overwrite = overwrite
+        self.fast_copy = fast_copy
+        self.backup = backup
+        self.displace_to = displace_to
+        self.copied = False
+        # False once an overwrite went ahead without a backup to undo it.
+        self.undoable = True
+        self.record = record
+        self.failure_message = failure_message or "Error: File operation failed. Check logs for details."
+        self.state = "queued"
+        self.error = None
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+        self.started = None
+        self.finished = None
+        self._cancelled = threading.Event()
+        self._counter_lock = threading.Lock()
+
+    @property
+    def label(self):
+        return JOB_LABELS[self.kind]
+
+    @property
+    def name(self):
+        if self.items is not None:
+            return f"{len(self.items)} items"
+        return os.path.basename(self.src.rstrip(os.sep)) or self.src
+
+    def paths(self):
+        pairs = self.items if self.items is not None else [(self.src, self.dst), (self.displace_to, None)]
+        return [path for pair in pairs for path in pair if path]
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def advance(self, byte_count=0, file_count=0):
+        with self._counter_lock:
+            self.done_bytes += byte_count
+            self.done_files += file_count
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def throughput(self):
+        elapsed = self.elapsed()
+        return self.done_bytes / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        rate = self.throughput()
+        if rate <= 0 or self.total_bytes <= self.done_bytes:
+            return None
+        return (self.total_bytes - self.done_bytes) / rate
+
+
+def measure(path, job, follow_symlinks=True):
+    # Counts what a copy of path will write: like copy_path() and
+    # copy_tree(), symlinks to files and folders are followed. A delete
+    # removes links rather than what they point to, so it passes
+    # follow_symlinks=False.
+    info = os.stat(path) if follow_symlinks else os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        return 1, info.st_size
+
+    file_count, byte_count = 0, 0
+    for _, entries in walker.walk(path, cancelled=job._cancelled):
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    continue
+                if follow_symlinks and entry.is_dir():
+                    linked_files, linked_bytes = measure(entry.path, job)
+                    file_count += linked_files
+                    byte_count += linked_bytes
+                elif not follow_symlinks or entry.is_file():
+                    file_count += 1
+                    byte_count += entry.stat(follow_symlinks=follow_symlinks).st_size
+            except OSError:
+                continue
+    job.check()
+    return file_count, byte_count
+
+
+def kernel_copy(copy, infd, outfd, job):
+    # Returns False when the method copied nothing at all, which on some
+    # pseudo filesystems is how "unsupported" shows up instead of an error.
+    copied = False
+    while True:
+        job.check()
+        sent = copy(infd, outfd, COPY_CHUNK_SIZE)
+        if not sent:
+            return copied
+        copied = True
+        job.advance(sent)
+
+
+def copy_data(fsrc, fdst, job):
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    for name, copy in kernel_copy_methods:
+        if name in disabled_kernel_copy_methods:
+            continue
+        try:
+            if kernel_copy(copy, infd, outfd, job):
+                return
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_UNSUPPORTED:
+                raise
+            if e.errno == errno.ENOSYS:
+                disabled_kernel_copy_methods.add(name)
+
+    buffer = bytearray(COPY_CHUNK_SIZE)
+    view = memoryview(buffer)
+    while True:
+        job.check()
+        read = fsrc.readinto(buffer)
+        if not read:
+            return
+        fdst.write(view[:read])
+        job.advance(read)
+
+
+def clone_file(fsrc, fdst):
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError as e:
+        if e.errno in CLONE_UNSUPPORTED:
+            return False
+        raise
+
+
+def link_file(src, dst):
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as e:
+        if e.errno in LINK_UNSUPPORTED:
+            return False
+        raise
+
+
+def copy_file(src, dst, job):
+    if job.overwrite:
+        # Overwriting a file with itself (e.g. an earlier hard-link paste)
+        # would truncate the source before it is read.
+        try:
+            if os.path.samefile(src, dst):
+                job.advance(os.stat(src).st_size, 1)
+                return dst
+        except FileNotFoundError:
+            pass
+        # The snapshot may hard-link the old file, so it is replaced rather
+        # than written through.
+        try:
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+
+    # A clone is preferred over a hard link: both are instant, but only the
+    # clone keeps later edits to either file apart.
+    try_link = job.fast_copy == "hardlink"
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if job.fast_copy != "off" and clone_file(fsrc, fdst):
+            job.advance(os.fstat(fsrc.fileno()).st_size)
+            try_link = False
+        elif not try_link:
+            copy_data(fsrc, fdst, job)
+
+    if try_link:
+        # The clone failed; swap the empty file it was tried on for a link.
+        os.unlink(dst)
+        if link_file(src, dst):
+            job.advance(os.stat(src).st_size, 1)
+            return dst
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            copy_data(fsrc, fdst, job)
+    shutil.copystat(src, dst)
+    job.advance(file_count=1)
+    return dst
+
+
+class CopyPool:
+    # Copies files on a pool of threads with a bounded number of them in
+    # flight. The first error stops further work and is raised by finish(),
+    # which then runs the steps deferred with then() in reverse order.
+
+    def __init__(self):
+        self.errors = []
+        self._deferred = []
+        self._in_flight = threading.BoundedSemaphore(COPY_IN_FLIGHT)
+        self._executor = ThreadPoolExecutor(max_workers=COPY_WORKERS, thread_name_prefix="copy")
+
+    def _run(self, function, args, kwargs):
+        try:
+            if not self.errors:
+                function(*args, **kwargs)
+        except BaseException as e:
+            self.errors.append(e)
+        finally:
+            self._in_flight.release()
+
+    def submit(self, function, *args, **kwargs):
+        self._in_flight.acquire()
+        self._executor.submit(self._run, function, args, kwargs)
+
+    def then(self, function, *args):
+        self._deferred.append((function, args))
+
+    def abandon(self):
+        self._executor.shutdown(wait=True)
+
+    def finish(self, job):
+        self._executor.shutdown(wait=True)
+        job.check()
+        if self.errors:
+            raise self.errors[0]
+        for function, args in reversed(self._deferred):
+            function(*args)
+
+
+def copy_tree(src, dst, job, overwrite=False, pool=None):
+    # Directories are created as the walker reaches them while their files
+    # are already being copied on the pool; directory metadata is applied
+    # last so the copies don't bump the mtimes that copystat restored. A
+    # batch passes in its shared pool and finishes it itself.
+    own_pool = pool is None
+    pool = pool or CopyPool()
+    try:
+        os.makedirs(dst, exist_ok=overwrite)
+        for relpath, entries in walker.walk(src, cancelled=job._cancelled):
+            pool.then(shutil.copystat, os.path.join(src, relpath), os.path.join(dst, relpath))
+            for entry in entries:
+                if pool.errors:
+                    break
+                target = os.path.join(dst, relpath, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        os.makedirs(target, exist_ok=overwrite)
+                    elif entry.is_dir():
+                        pool.submit(
+                            shutil.copytree,
+                            entry.path,
+                            target,
+                            copy_function=lambda s, d: copy_file(s, d, job),
+                            dirs_exist_ok=overwrite,
+                        )
+                    elif entry.is_file():
+                        pool.submit(copy_file, entry.path, target, job)
+                    else:
+                        raise shutil.SpecialFileError(f"`{entry.path}` is a named pipe or special file")
+                except OSError as e:
+                    pool.errors.append(e)
+            if pool.errors:
+                break
+    except BaseException:
+        if own_pool:
+            pool.abandon()
+        raise
+    if own_pool:
+        pool.finish(job)
+
+
+def copy_path(src, dst, job, overwrite=False):
+    created = not os.path.lexists(dst)
+    try:
+        if os.path.isdir(src):
+            copy_tree(src, dst, job, overwrite)
+        else:
+            copy_file(src, dst, job)
+    except BaseException:
+        # Never leave a half-written copy behind under the name the user
+        # asked for; the source is still intact at this point.
+        if created and os.path.lexists(dst):
+            try:
+                delete_path(dst)
+            except OSError:
+                pass
+        raise
+
+
+def delete_path(path, job=None):
+    if os.path.isdir(path) and not os.path.islink(path):
+        for root, dirs, files in os.walk(path, topdown=False):
+            for name in files:
+                if job is not None:
+                    job.check()
+                os.remove(os.path.join(root, name))
+                if job is not None:
+                    job.advance(file_count=1)
+            for name in dirs:
+                child = os.path.join(root, name)
+                if os.path.islink(child):
+                    os.remove(child)
+                else:
+                    os.rmdir(child)
+        os.rmdir(path)
+    else:
+        os.remove(path)
+        if job is not None:
+            job.advance(file_count=1)
+
+
+def rename_path(src, dst):
+    try:
+        os.rename(src, dst)
+        return True
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return False
+        raise
+
+
+def move_path(src, dst, job, overwrite=False):
+    if not overwrite and rename_path(src, dst):
+        job.advance(job.total_bytes, job.total_files)
+        return
+    copy_path(src, dst, job, overwrite)
+    job.copied = True
+    # The copy is complete, so removing the source is no longer cancellable:
+    # stopping half way would leave two partial trees.
+    delete_path(src)
+
+
+def find_mount(path):
+    path = os.path.abspath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def storage_list():
+    # Every storage directory ever used, trash bins and backups alike, one
+    # per line, so a later session can clean up on filesystems it has not
+    # touched yet. It started out as the list of trash bins, hence the place.
+    return os.path.join(fileindex.cache_dir("trash"), ".bins")
+
+
+def known_storage(kind):
+    directories = {fileindex.cache_dir(kind)}
+    try:
+        with open(storage_list(), "r", encoding="utf-8") as f:
+            for line in f:
+                directory = line.rstrip("\n")
+                if directory and os.path.basename(directory) == kind:
+                    directories.add(directory)
+    except OSError:
+        pass
+    return directories
+
+
+def remember_storage(directory, kind):
+    if directory in known_storage(kind):
+        return
+    try:
+        with open(storage_list(), "a", encoding="utf-8") as f:
+            f.write(directory + "\n")
+    except OSError:
+        pass
+
+
+def storage_dir(path, kind):
+    # A private directory on the same filesystem as path, so that moving
+    # something into it is a rename and cloning from it is possible. The
+    # user cache directory is used when it already lives there; otherwise a
+    # per-user directory at the top of that filesystem, like the XDG trash
+    # does. If neither works the cache directory is still returned, which
+    # means a full copy instead of a rename.
+    home = fileindex.cache_dir(kind)
+    try:
+        device = os.stat(os.path.dirname(os.path.abspath(path))).st_dev
+        if os.stat(home).st_dev == device:
+            return home
+        owner = str(os.getuid()) if hasattr(os, "getuid") else "user"
+        candidate = os.path.join(find_mount(path), f".nlike-fm-{owner}", kind)
+        os.makedirs(candidate, exist_ok=True)
+        remember_storage(candidate, kind)
+        return candidate
+    except OSError:
+        return home
+
+
+def backup_path(path):
+    # The holder is named after this process, so a later session can tell
+    # the backups of one that died from those of one still running.
+    try:
+        holder = tempfile.mkdtemp(prefix=f"backup-{os.getpid()}-", dir=storage_dir(path, "backups"))
+    except OSError:
+        return None
+    return os.path.join(holder, os.path.basename(path.rstrip(os.sep)) or "root")
+
+
+def backup_owner(holder):
+    # The process that made a backup holder, or None if the name has none.
+    try:
+        return int(os.path.basename(holder).split("-")[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def snapshot_file(src, dst):
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return True
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        cloned = clone_file(fsrc, fdst)
+    if not cloned:
+        os.unlink(dst)
+        return link_file(src, dst)
+    shutil.copystat(src, dst)
+    return True
+
+
+def snapshot_tree(path, backup):
+    for root, dirs, files in os.walk(path):
+        target = os.path.normpath(os.path.join(backup, os.path.relpath(root, path)))
+        os.makedirs(target)
+        # os.walk lists links to folders among the folders but never enters them.
+        links = [name for name in dirs if os.path.islink(os.path.join(root, name))]
+        for name in files + links:
+            if not snapshot_file(os.path.join(root, name), os.path.join(target, name)):
+                return False
+    # Folder metadata goes last, since filling a folder changes its mtime.
+    for root, _, _ in os.walk(path):
+        shutil.copystat(root, os.path.normpath(os.path.join(backup, os.path.relpath(root, path))))
+    return True
+
+
+def snapshot(path, backup):
+    # Keeps path's current contents at backup by cloning each file, or hard
+    # linking it where cloning is not supported; copy_file() replaces files
+    # on overwrite, so a link keeps the old data. Returns False, leaving no
+    # backup behind, when neither works: copying the bytes instead would
+    # double the I/O of the overwrite.
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            taken = snapshot_tree(path, backup)
+        else:
+            taken = snapshot_file(path, backup)
+    except BaseException:
+        discard_backup(backup)
+        raise
+    if not taken:
+        discard_backup(backup)
+    return taken
+
+
+def roll_back(path, backup):
+    if os.path.lexists(path):
+        delete_path(path)
+    move_path(backup, path, Job("move", backup, path))
+    discard_backup(backup)
+
+
+def discard_backup(backup):
+    holder = os.path.dirname(backup)
+    if os.path.lexists(backup):
+        delete_path(backup)
+    try:
+        os.rmdir(holder)
+    except OSError:
+        pass
+
+
+def run_batch(job):
+    # All items of a batch share one measurement pass and one copy pool.
+    # Moves are tried as renames first, so a same-filesystem batch never
+    # copies anything. If the batch fails part way, renamed items are moved
+    # back and partial copies removed, so it either happens or it doesn't;
+    # sources of moves are only removed once every copy has finished.
+    sizes = [measure(src, job, job.kind != "delete") for src, _ in job.items]
+    job.total_files = sum(file_count for file_count, _ in sizes)
+    job.total_bytes = sum(byte_count for _, byte_count in sizes)
+
+    if job.kind == "delete":
+        for src, _ in job.items:
+            job.check()
+            delete_path(src, job)
+        return
+
+    renamed, pending, created = [], [], []
+    pool = CopyPool()
+    try:
+        for (src, dst), (file_count, byte_count) in zip(job.items, sizes):
+            job.check()
+            if job.kind == "move" and rename_path(src, dst):
+                renamed.append((src, dst))
+                job.advance(byte_count, file_count)
+                continue
+            pending.append((src, dst))
+            if not os.path.lexists(dst):
+                created.append(dst)
+            if os.path.isdir(src):
+                copy_tree(src, dst, job, pool=pool)
+            else:
+                pool.submit(copy_file, src, dst, job)
+        pool.finish(job)
+    except BaseException:
+        pool.abandon()
+        for dst in created:
+            try:
+                if os.path.lexists(dst):
+                    delete_path(dst)
+            except OSError:
+                pass
+        for src, dst in reversed(renamed):
+            try:
+                os.rename(dst, src)
+            except OSError:
+                pass
+        raise
+
+    job.copied = True
+    if job.kind == "move":
+        for src, _ in pending:
+            delete_path(src)
+
+
+def run_job(job):
+    job.started = time.monotonic()
+    job.state = "running"
+    snapshot_taken = False
+    try:
+        if job.items is not None:
+            run_batch(job)
+        elif job.kind == "move" and not job.overwrite and rename_path(job.src, job.dst):
+            job.done_files = job.total_files = 1
+        elif job.kind == "restore":
+            if job.displace_to:
+                move_path(job.dst, job.displace_to, Job("move", job.dst, job.displace_to))
+            elif os.path.lexists(job.dst):
+                delete_path(job.dst)
+            move_path(job.src, job.dst, job)
+            discard_backup(job.src)
+        else:
+            job.total_files, job.total_bytes = measure(job.src, job, job.kind != "delete")
+            if job.backup and os.path.lexists(job.dst):
+                snapshot_taken = snapshot(job.dst, job.backup)
+                if not snapshot_taken:
+                    job.backup = None
+                    job.record = None
+                    job.undoable = False
+            if job.kind == "copy":
+                copy_path(job.src, job.dst, job, job.overwrite)
+                job.copied = True
+            elif job.kind == "move":
+                move_path(job.src, job.dst, job, job.overwrite)
+            elif job.kind == "delete":
+                delete_path(job.src, job)
+        job.state = "done"
+    except JobCancelled:
+        job.state = "cancelled"
+    except Exception as e:
+        job.error = e
+        job.state = "failed"
+    finally:
+        if job.state != "done" and job.backup and job.kind != "restore":
+            # An overwrite that stopped part way is put back from its
+            # snapshot; one that never started just drops the snapshot. Once
+            # the data is fully copied the new contents are kept.
+            try:
+                if snapshot_taken and not job.copied:
+                    roll_back(job.dst, job.backup)
+                else:
+                    discard_backup(job.backup)
+            except OSError as e:
+                job.error = job.error or e
+        job.finished = time.monotonic()
+
+
+class JobQueue:
+    def __init__(self, workers=1):
+        self.jobs = []
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self):
+        while True:
+            job = self._pending.get()
+            if job.cancelled:
+                job.state = "cancelled"
+            else:
+                run_job(job)
+
+    def submit(self, job):
+        with self._lock:
+            self.jobs.append(job)
+        self._pending.put(job)
+        return job
+
+    def active(self):
+        with self._lock:
+            return [job for job in self.jobs if job.state not in FINISHED_STATES]
+
+    def drain(self):
+        with self._lock:
+            finished = [job for job in self.jobs if job.state in FINISHED_STATES]
+            self.jobs = [job for job in self.jobs if job.state not in FINISHED_STATES]
+        return finished
+
+    def cancel_current(self):
+        active = self.active()
+        if active:
+            active[0].cancel()
+            return active[0]
+        return None
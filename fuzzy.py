@@ -0,0 +1,215 @@
+import heapq
+import os
+import re
+import threading
+import time
+
+import fileindex
+
+
+# Only this many of the best matches are kept and shown.
+TOP_K = 1000
+# Candidates looked at per batch; the caller checks the keyboard in between.
+BATCH_CANDIDATES = 8192
+
+# fzf-style scoring: every query character that matches earns SCORE_MATCH and
+# every character skipped inside the match costs GAP_PENALTY. A term found
+# as-is earns BONUS_CONSECUTIVE per character; one that starts a path segment
+# or a word, or lies inside the file name, earns the other bonuses.
+SCORE_MATCH = 16
+GAP_PENALTY = 1
+BONUS_CONSECUTIVE = 4
+BONUS_SEGMENT = 12
+BONUS_BOUNDARY = 8
+BONUS_BASENAME = 16
+# Entries of a directory changed within RECENT_SECONDS earn up to
+# BONUS_RECENT, less the longer ago it was.
+BONUS_RECENT = 12
+RECENT_SECONDS = 7 * 24 * 60 * 60
+WORD_SEPARATORS = "_-. "
+SEPARATORS = (os.sep, "/")
+
+
+class Term:
+    def __init__(self, text):
+        self.length = len(text)
+        self.exact = re.compile(re.escape(text), re.IGNORECASE)
+        self.fuzzy = re.compile(".*?".join(re.escape(char) for char in text), re.IGNORECASE)
+
+
+def score_span(path, start, end, length, basename_start):
+    score = length * SCORE_MATCH - (end - start - length) * GAP_PENALTY
+    if end - start == length:
+        score += BONUS_CONSECUTIVE * length
+    if start == 0 or path[start - 1] in SEPARATORS:
+        score += BONUS_SEGMENT
+    elif path[start - 1] in WORD_SEPARATORS or (path[start].isupper() and path[start - 1].islower()):
+        score += BONUS_BOUNDARY
+    if start >= basename_start:
+        score += BONUS_BASENAME
+    return score
+
+
+def score_term(term, path, basename_start):
+    # Tries the alignments most likely to score best, in order: the term
+    # as-is, then spread out, each first within the file name.
+    for pattern in (term.exact, term.fuzzy):
+        match = pattern.search(path, basename_start) or pattern.search(path)
+        if match is not None:
+            return score_span(path, match.start(), match.end(), term.length, basename_start)
+    return None
+
+
+class Pass:
+    # One query's run through its candidates: `sources` holds the
+    # (sequence, position) pairs of candidate indexes still to look at.
+
+    def __init__(self, query, sources):
+        self.query = query
+        self.terms = sorted((Term(text) for text in query.split()), key=lambda term: term.length, reverse=True)
+        self.sources = sources
+        self.total = sum(len(sequence) - position for sequence, position in sources)
+        self.scanned = 0
+        self.matched = []
+        self.best = []
+
+    @property
+    def done(self):
+        return not self.sources
+
+    def narrowed(self, query):
+        # Whatever matches a longer query also matches this one, so it only
+        # has to look at what this pass matched plus what it has not reached.
+        return Pass(query, [(tuple(self.matched), 0)] + list(self.sources))
+
+
+class FuzzyMatcher:
+    # Ranks `paths` against a query a batch at a time. Each query extending
+    # the previous one narrows that one's matches instead of starting over,
+    # and deleting characters goes back to the pass already made for the
+    # shorter query.
+
+    def __init__(self, paths, mtimes, top_k=TOP_K):
+        self.paths = paths
+        self.mtimes = mtimes
+        self.top_k = top_k
+        self.now_ns = time.time_ns()
+        self.query = ""
+        self._passes = []
+
+    def set_query(self, query):
+        self.query = query
+        while self._passes and not query.startswith(self._passes[-1].query):
+            self._passes.pop()
+        if not query.split():
+            self._passes = []
+        elif not self._passes:
+            self._passes.append(Pass(query, [(range(len(self.paths)), 0)]))
+        elif self._passes[-1].query != query:
+            self._passes.append(self._passes[-1].narrowed(query))
+
+    @property
+    def current(self):
+        return self._passes[-1] if self._passes else None
+
+    def done(self):
+        return self.current is None or self.current.done
+
+    def work(self, seconds):
+        # Matches batches until `seconds` have passed; returns True once the
+        # current query has been run against every candidate.
+        deadline = time.perf_counter() + seconds
+        while not self.done():
+            self._scan(self.current)
+            if time.perf_counter() >= deadline:
+                break
+        return self.done()
+
+    def _recency(self, index):
+        age = (self.now_ns - self.mtimes[index]) / 1e9
+        return BONUS_RECENT * max(0.0, 1 - age / RECENT_SECONDS)
+
+    def _scan(self, current):
+        sequence, position = current.sources[0]
+        batch = sequence[position : position + BATCH_CANDIDATES]
+        if position + len(batch) >= len(sequence):
+            current.sources.pop(0)
+        else:
+            current.sources[0] = (sequence, position + len(batch))
+        current.scanned += len(batch)
+
+        paths, best, top_k = self.paths, current.best, self.top_k
+        first, terms = current.terms[0].fuzzy, current.terms
+        for index in batch:
+            path = paths[index]
+            # Most candidates fail the longest term, checked once in C.
+            if first.search(path) is None:
+                continue
+            basename_start = max(path.rfind(separator) for separator in SEPARATORS) + 1
+            score = 0
+            for term in terms:
+                term_score = score_term(term, path, basename_start)
+                if term_score is None:
+                    break
+                score += term_score
+            else:
+                current.matched.append(index)
+                # Shorter paths win ties, like fzf.
+                entry = (score + self._recency(index), -len(path), -index)
+                if len(best) < top_k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+    def results(self):
+        if self.current is None:
+            return self.paths[: self.top_k]
+        return [self.paths[-negated] for _, _, negated in sorted(self.current.best, reverse=True)]
+
+    def progress(self):
+        # (matches so far, candidates looked at, candidates to look at).
+        current = self.current
+        if current is None:
+            return len(self.paths), len(self.paths), len(self.paths)
+        return len(current.matched), current.scanned, current.total
+
+
+class FuzzyFinder:
+    # Supplies the candidates: every path under root, from the search index.
+    # A warm index is used straight away; the refresh that follows on a
+    # background thread replaces the matcher if anything changed.
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.matcher = None
+        self.indexed = 0
+        self.done = False
+        self.error = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _count(self, relpath, names):
+        self.indexed += len(names)
+
+    def _run(self):
+        index = fileindex.get_index(self.root)
+        try:
+            with index.lock:
+                if index.dirs:
+                    self.matcher = FuzzyMatcher(*index.relative_paths())
+                changed = index.update(self._count, self._cancelled)
+                if changed:
+                    index.save()
+                if (changed or self.matcher is None) and not self._cancelled.is_set():
+                    self.matcher = FuzzyMatcher(*index.relative_paths())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
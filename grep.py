@@ -0,0 +1,203 @@
+import fnmatch
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import preview
+import walker
+
+
+# Files bigger than this are not searched.
+MAX_FILE_BYTES = 32 * 1024 * 1024
+# Files at least this big are searched through mmap rather than read in.
+MMAP_MIN_BYTES = 1024 * 1024
+# Text is lowered for matching this much at a time.
+FOLD_CHUNK_BYTES = 1024 * 1024
+# Directories holding less than this much to search are searched on the
+# walker thread that listed them; shipping them to a process costs more.
+PROCESS_BATCH_BYTES = 4 * 1024 * 1024
+# Only the first matches of a file are reported.
+MATCHES_PER_FILE = 50
+SNIPPET_BYTES = 200
+IGNORE = [
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", ".tox", ".mypy_cache",
+    # The trash and overwrite snapshots kept by fileops.
+    ".nlike-fm-*",
+]
+
+
+def find_folded(data, needle):
+    # Yields where `needle`, in lowercase, occurs in `data` ignoring ASCII
+    # case. Lowering a chunk and searching it with find() is several times
+    # faster than an IGNORECASE pattern, and chunks keep a mapped file from
+    # being copied whole. Chunks overlap by one byte less than the needle,
+    # so no match is cut in two or found twice.
+    overlap = len(needle) - 1
+    for chunk_start in range(0, len(data), FOLD_CHUNK_BYTES):
+        chunk = data[chunk_start : chunk_start + FOLD_CHUNK_BYTES + overlap].lower()
+        position = chunk.find(needle)
+        while position != -1:
+            yield chunk_start + position
+            position = chunk.find(needle, position + 1)
+
+
+def grep_file(path, needle, max_matches=MATCHES_PER_FILE):
+    # Returns (line number, line) for the lines of a text file that contain
+    # `needle`, ignoring case. Binary files are skipped after a look at
+    # their first bytes.
+    needle = needle.lower()
+    with open(path, "rb") as f:
+        sample = f.read(preview.SNIFF_BYTES)
+        if preview.looks_binary(sample):
+            return []
+        size = os.fstat(f.fileno()).st_size
+        if size <= len(sample):
+            data = sample
+        elif size >= MMAP_MIN_BYTES:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = sample + f.read()
+
+    try:
+        matches = []
+        line_number, counted, position = 0, 0, 0
+        for start in find_folded(data, needle):
+            # One result per line, however often it matches.
+            if start < position:
+                continue
+            if len(matches) >= max_matches:
+                break
+            line_number += data[counted:start].count(b"\n")
+            counted = start
+            line_start = data.rfind(b"\n", 0, start) + 1
+            line_end = data.find(b"\n", start)
+            if line_end == -1:
+                line_end = len(data)
+            # Long lines are cut to a window around the match.
+            line_start = max(line_start, start - SNIPPET_BYTES // 2)
+            line = data[line_start : min(line_end, line_start + SNIPPET_BYTES)]
+            matches.append((line_number, preview.printable(line.decode("utf-8", "replace").strip())))
+            position = line_end + 1
+        return matches
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def grep_files(paths, needle):
+    found = []
+    for path in paths:
+        try:
+            found.extend((path, line_number, line) for line_number, line in grep_file(path, needle))
+        except (OSError, ValueError):
+            continue
+    return found
+
+
+class MatchLabels(list):
+    # Display labels of content matches; none of them is a folder, so the
+    # file list can color them without a stat.
+    def is_dir_at(self, position):
+        return False
+
+
+class ContentSearchJob:
+    # Runs a content search on a background thread, with the same interface
+    # as search.SearchJob. `results` holds (path, line number, line) tuples
+    # and only ever grows, so the UI can read it at any time. Files are read
+    # on the walker threads, or for big directories in worker processes.
+
+    def __init__(self, root, query, limit, processes=0, max_file_bytes=MAX_FILE_BYTES, ignore=IGNORE):
+        self.root = os.path.abspath(root)
+        self.query = query
+        self.needle = query.encode("utf-8", "surrogateescape")
+        self.limit = limit
+        self.processes = processes
+        self.max_file_bytes = max_file_bytes
+        self.ignored = re.compile("|".join(fnmatch.translate(pattern) for pattern in ignore)) if ignore else None
+        self.results = []
+        self.files_searched = 0
+        self.truncated = False
+        self.done = False
+        self.error = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+        self._stopped.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _add(self, found):
+        with self._lock:
+            room = self.limit - len(self.results)
+            if len(found) > room:
+                found = found[:room]
+                self.truncated = True
+                self._stopped.set()
+            if found:
+                self.results.extend(found)
+
+    def _scan(self, relpath, path):
+        with os.scandir(path) as entries:
+            entries = list(entries)
+        files, subdirs, total_bytes = [], [], 0
+        for entry in entries:
+            if self.ignored is not None and self.ignored.match(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    size = entry.stat(follow_symlinks=False).st_size
+                    if 0 < size <= self.max_file_bytes:
+                        files.append(entry.path)
+                        total_bytes += size
+            except OSError:
+                continue
+
+        if files and not self._stopped.is_set():
+            found = self._grep(files, total_bytes)
+            with self._lock:
+                self.files_searched += len(files)
+            self._add(found)
+        return None, subdirs
+
+    def _grep(self, files, total_bytes):
+        pool = self._pool
+        if pool is not None and total_bytes >= PROCESS_BATCH_BYTES:
+            try:
+                return pool.submit(grep_files, files, self.needle).result()
+            except (BrokenProcessPool, OSError):
+                # Worker processes could not start or died; the rest of the
+                # search, this folder included, runs on the walker threads.
+                self._pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+        return grep_files(files, self.needle)
+
+    def _run(self):
+        try:
+            if self.processes:
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            for _ in walker.walk(self.root, self._scan, cancelled=self._stopped):
+                pass
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self.done = True
@@ -0,0 +1,363 @@
+import itertools
+import os
+import threading
+import time
+from array import array
+
+
+# A directory whose mtime is this close to the moment it was listed may still
+# change within the same timestamp tick (coarse NFS/FAT clocks), so such a
+# listing is never trusted on the next lookup.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+# The first chunk is read before returning, so small directories (nearly all
+# of them) are listed in one go. Anything larger is shown from its first
+# chunk while the rest is read and sorted on a background thread.
+FIRST_CHUNK_ENTRIES = 4096
+CHUNK_ENTRIES = 65536
+# On Windows scandir already carries each entry's size and mtime; elsewhere
+# they would cost a stat per entry, so they are not kept at all.
+STAT_IS_FREE = os.name == "nt"
+
+KIND_DIR = 1
+KIND_FILE = 2
+
+
+class EntryStore:
+    # The entries of one directory, packed for directories with millions of
+    # entries: every name lives in one string with an offset array into it,
+    # and kind, size and mtime are parallel arrays (size and mtime are None
+    # unless STAT_IS_FREE). `order` maps display positions (folders first,
+    # each group sorted by name) to entries. Indexing, len(), `in` and
+    # index() work on display positions, like the list of names this
+    # replaces.
+    __slots__ = ("_chunks", "_blob", "_starts", "kinds", "sizes", "mtimes", "order", "dir_count")
+
+    def __init__(self):
+        self._chunks = []
+        self._blob = ""
+        self._starts = array("Q", [0])
+        self.kinds = array("B")
+        self.sizes = array("q") if STAT_IS_FREE else None
+        self.mtimes = array("q") if STAT_IS_FREE else None
+        self.order = array("I")
+        self.dir_count = 0
+
+    def add(self, chunk):
+        names, kinds, sizes, mtimes = chunk
+        if not names:
+            return
+        ends = itertools.accumulate((len(name) + 1 for name in names), initial=self._starts[-1])
+        next(ends)
+        self._starts.extend(ends)
+        self.kinds.extend(kinds)
+        if STAT_IS_FREE:
+            self.sizes.extend(sizes)
+            self.mtimes.extend(mtimes)
+        self._chunks.append("\0".join(names) + "\0")
+
+    def finish(self):
+        self._blob = "".join(self._chunks)
+        self._chunks = []
+        # Sorting goes through a throwaway list of the names; slicing each
+        # one out of the blob per comparison key would be several times slower.
+        names = self._blob.split("\0")
+        directories = [i for i, kind in enumerate(self.kinds) if kind == KIND_DIR]
+        files = [i for i, kind in enumerate(self.kinds) if kind != KIND_DIR]
+        directories.sort(key=names.__getitem__)
+        files.sort(key=names.__getitem__)
+        del names
+        self.order = array("I", directories)
+        self.order.extend(files)
+        self.dir_count = len(directories)
+        return self
+
+    def name(self, entry):
+        return self._blob[self._starts[entry] : self._starts[entry + 1] - 1]
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, position):
+        return self.name(self.order[position])
+
+    def __iter__(self):
+        for entry in self.order:
+            yield self.name(entry)
+
+    def find(self, name):
+        # Binary search within whichever sorted group can hold the name.
+        for low, end in [(0, self.dir_count), (self.dir_count, len(self.order))]:
+            high = end
+            while low < high:
+                middle = (low + high) // 2
+                if self[middle] < name:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < end and self[low] == name:
+                return low
+        return -1
+
+    def index(self, name):
+        position = self.find(name)
+        if position < 0:
+            raise ValueError(f"{name!r} is not in the listing")
+        return position
+
+    def __contains__(self, name):
+        return self.find(name) >= 0
+
+    def is_dir_at(self, position):
+        return position < self.dir_count
+
+
+def read_entries(entries, limit):
+    # Reads up to `limit` entries from a scandir iterator into parallel
+    # (names, kinds, sizes, mtimes) lists; sizes and mtimes stay empty unless
+    # STAT_IS_FREE. Also returns whether the iterator ran out.
+    names, kinds, sizes, mtimes = chunk = ([], [], [], [])
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                kind = KIND_DIR
+            elif entry.is_file():
+                kind = KIND_FILE
+            else:
+                continue
+            if STAT_IS_FREE:
+                info = entry.stat()
+                sizes.append(info.st_size)
+                mtimes.append(info.st_mtime_ns)
+        except OSError:
+            continue
+        names.append(entry.name)
+        kinds.append(kind)
+        if len(names) >= limit:
+            return chunk, False
+    return chunk, True
+
+
+class Listing:
+    __slots__ = ("names", "mtime_ns", "listed_ns", "checked_ns", "complete")
+
+    def __init__(self, names, mtime_ns, listed_ns, complete=True):
+        self.names = names
+        self.mtime_ns = mtime_ns
+        self.listed_ns = listed_ns
+        # Last time the listing was known to match the directory.
+        self.checked_ns = listed_ns
+        self.complete = complete
+
+    def is_dir(self, name):
+        position = self.names.find(name)
+        return position >= 0 and self.names.is_dir_at(position)
+
+    def is_racy(self):
+        return self.listed_ns - self.mtime_ns < RACY_WINDOW_NS
+
+
+class ListingLoader:
+    # Reads the rest of a large directory on a background thread. Until it
+    # is done, `partial` (the sorted first chunk) stands in for the listing.
+
+    def __init__(self, cache, key, mtime_ns, listed_ns, entries, first_chunk, generation):
+        self.cache = cache
+        self.key = key
+        self.mtime_ns = mtime_ns
+        self.listed_ns = listed_ns
+        self.generation = generation
+        self.count = len(first_chunk[0])
+        first = EntryStore()
+        first.add(first_chunk)
+        self.partial = Listing(first.finish(), mtime_ns, listed_ns, complete=False)
+        self._entries = entries
+        self._first_chunk = first_chunk
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        store = EntryStore()
+        store.add(self._first_chunk)
+        self._first_chunk = None
+        try:
+            with self._entries:
+                exhausted = False
+                while not exhausted:
+                    if self.cache.superseded(self):
+                        return
+                    chunk, exhausted = read_entries(self._entries, CHUNK_ENTRIES)
+                    store.add(chunk)
+                    self.count += len(chunk[0])
+        except OSError:
+            self.cache.finish_loading(self, None)
+            return
+        self.cache.finish_loading(self, Listing(store.finish(), self.mtime_ns, self.listed_ns))
+
+
+class ListingCache:
+    def __init__(self):
+        self._listings = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        # Directories a watcher reports every change for, mapped to when the
+        # watch began. A listing checked since then is reused without
+        # stat'ing the directory until invalidated.
+        self.watched = {}
+        # Bumped by invalidate(); a read that overlapped an invalidation of
+        # its directory may have missed the change and is not kept.
+        self._epoch = 0
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.checks = 0
+
+    def _generation(self, key):
+        return self._epoch, self._generations.get(key, 0)
+
+    def get(self, directory):
+        key = os.path.abspath(directory)
+        with self._lock:
+            cached = self._listings.get(key)
+            if cached is not None and cached.checked_ns >= self.watched.get(key, cached.checked_ns + 1):
+                self.hits += 1
+                return cached
+
+        mtime_ns = os.stat(key).st_mtime_ns
+        with self._lock:
+            self.checks += 1
+            if cached is not None and cached.mtime_ns == mtime_ns and not cached.is_racy():
+                cached.checked_ns = time.time_ns()
+                self.hits += 1
+                return cached
+            loader = self._loading.get(key)
+            if loader is not None and loader.mtime_ns == mtime_ns:
+                return loader.partial
+            self.misses += 1
+            generation = self._generation(key)
+
+        listed_ns = time.time_ns()
+        entries = os.scandir(key)
+        try:
+            first_chunk, exhausted = read_entries(entries, FIRST_CHUNK_ENTRIES)
+        except BaseException:
+            entries.close()
+            raise
+
+        if not exhausted:
+            loader = ListingLoader(self, key, mtime_ns, listed_ns, entries, first_chunk, generation)
+            with self._lock:
+                self._loading[key] = loader
+            return loader.start().partial
+
+        entries.close()
+        store = EntryStore()
+        store.add(first_chunk)
+        listing = Listing(store.finish(), mtime_ns, listed_ns)
+        with self._lock:
+            if generation == self._generation(key):
+                self._listings[key] = listing
+        return listing
+
+    def superseded(self, loader):
+        with self._lock:
+            return self._loading.get(loader.key) is not loader or loader.generation != self._generation(loader.key)
+
+    def finish_loading(self, loader, listing):
+        with self._lock:
+            if self._loading.get(loader.key) is not loader:
+                return
+            del self._loading[loader.key]
+            if listing is not None and loader.generation == self._generation(loader.key):
+                self._listings[loader.key] = listing
+
+    def loading(self, directory):
+        # Number of entries read so far while a directory is still loading,
+        # otherwise None.
+        loader = self._loading.get(os.path.abspath(directory))
+        return None if loader is None else loader.count
+
+    def cancel_loading(self, directory):
+        # Stops a background read without invalidating anything; the next
+        # get() simply starts it again.
+        with self._lock:
+            self._loading.pop(os.path.abspath(directory), None)
+
+    def set_watched(self, directories):
+        now = time.time_ns()
+        with self._lock:
+            self.watched = {directory: self.watched.get(directory, now) for directory in directories}
+
+    def invalidate(self, directory=None):
+        with self._lock:
+            if directory is None:
+                self._epoch += 1
+                self._listings.clear()
+                self._loading.clear()
+            else:
+                key = os.path.abspath(directory)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._listings.pop(key, None)
+                self._loading.pop(key, None)
+
+    def counters(self):
+        # Running totals, which the frame profiler turns into per-frame counts.
+        return {"hits": self.hits, "misses": self.misses, "checks": self.checks}
+
+
+class Prefetcher:
+    # Lists the directories the user is likely to open next on a background
+    # thread and leaves the results in the listing cache. A new request
+    # replaces whatever part of the previous one has not been read yet, and
+    # cancels the background reads it started for huge directories unless
+    # they are requested again or listed in `keep`.
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._requested = []
+        self._pending = []
+        self._loading = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, directories, keep=()):
+        with self._lock:
+            if directories == self._requested:
+                return
+            self._requested = directories
+            self._pending = list(directories)
+            abandoned = [d for d in self._loading if d not in directories and d not in keep]
+            self._loading = [d for d in self._loading if d not in abandoned]
+        for directory in abandoned:
+            self.cache.cancel_loading(directory)
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stopped.is_set():
+                with self._lock:
+                    if not self._pending:
+                        break
+                    directory = self._pending.pop(0)
+                try:
+                    self.cache.get(directory)
+                except OSError:
+                    # Not a directory, or not readable; the UI reports it if
+                    # the user actually goes there.
+                    continue
+                if self.cache.loading(directory) is not None:
+                    with self._lock:
+                        self._loading.append(directory)
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
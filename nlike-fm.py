@@ -1,32 +1,64 @@
-import logging
 import os
 import stat
 import time
 import curses
 import sys
-import shutil
-import pyperclip
-import subprocess
 import colors
-
-
-logging.basicConfig(
-    level=logging.ERROR,
-    filename=f"{os.path.splitext(os.path.basename(__file__))[0]}.log",
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+import dirsize
+import listing
+import profiler
+import render
+import statcache
+import tabs
+import watcher
+
+
+LOG_NAME = os.path.splitext(os.path.basename(__file__))[0]
+
+
+SEARCH_RESULT_LIMIT = 5000
+SEARCH_REFRESH_MS = 100
+SEARCH_PROCESSES = 0
+# Content search reads files on the walker threads, and folders holding
+# several megabytes on this many worker processes; one core is left free.
+CONTENT_SEARCH_PROCESSES = min(4, (os.cpu_count() or 1) - 1)
+# Lines shown above a content match when its preview opens.
+PREVIEW_CONTEXT_LINES = 3
+DUPLICATE_IGNORE = [".git", ".hg", ".svn", ".nlike-fm-*"]
+# Width of the bars in the disk usage view.
+USAGE_BAR_WIDTH = 20
+# The fuzzy finder ranks candidates for this long between looks at the keyboard.
+FUZZY_WORK_MS = 40
+FILE_OPERATION_WORKERS = 1
+FAST_COPY_MODE = "reflink"
+JOB_REFRESH_MS = 250
+WATCH_REFRESH_MS = 100
+DELETE_TO_TRASH = True
+TRASH_MAX_BYTES = 10 * 1024 ** 3
+TRASH_MAX_AGE_DAYS = 30
+# Shows frame times on screen and traces every frame to nlike-fm.trace.jsonl.
+# Also turned on by --profile or NLIKE_FM_PROFILE=1.
+PROFILE_FRAMES = os.environ.get("NLIKE_FM_PROFILE", "") not in ["", "0"]
+
+listing_cache = listing.ListingCache()
+stat_cache = statcache.StatCache()
 
 
 def log_error(error):
+    # The log file is only set up by the first error.
+    import logging
+
+    logging.basicConfig(
+        level=logging.ERROR,
+        filename=f"{LOG_NAME}.log",
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
     logging.error(f"{type(error).__name__}: {error}")
 
 
 def list_files(directory):
     try:
-        items = os.listdir(directory)
-        directories = [item for item in items if os.path.isdir(os.path.join(directory, item))]
-        files = [item for item in items if os.path.isfile(os.path.join(directory, item))]
-        return sorted(directories) + sorted(files), None
+        return listing_cache.get(directory).names, None
     except PermissionError:
         return [], "Permission to access the directory is denied."
     except FileNotFoundError:
@@ -51,9 +83,44 @@ def format_size(size_in_bytes):
     return f"{size:.2f} {units[unit_index]}"
 
 
-def get_file_info(file_path):
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes:02}:{seconds:02}"
+
+
+def format_job_progress(job, queued_count):
+    name = job.name
+    if job.state == "queued":
+        progress = "waiting"
+    elif job.kind == "delete" or not job.total_bytes:
+        progress = f"{job.done_files}/{job.total_files} file(s)"
+    else:
+        percent = min(100, job.done_bytes * 100 // job.total_bytes)
+        progress = (
+            f"{format_size(job.done_bytes)}/{format_size(job.total_bytes)} ({percent}%) "
+            f"{format_size(int(job.throughput()))}/s"
+        )
+        eta = job.eta()
+        if eta is not None:
+            progress += f" ETA {format_duration(eta)}"
+
+    queued = f" +{queued_count} queued" if queued_count else ""
+    return f"{job.label} {name}: {progress}{queued} [k] Cancel"
+
+
+def describe_job_error(job):
+    if isinstance(job.error, FileNotFoundError):
+        return "Error: File or directory not found."
+    if isinstance(job.error, PermissionError):
+        return "Error: Insufficient permissions for this operation."
+    return job.failure_message
+
+
+def get_file_info(file_path, dir_sizer=None):
     try:
-        mode = os.stat(file_path).st_mode
+        info = stat_cache.stat(file_path)
+        mode = info.st_mode
         is_dir = "d" if stat.S_ISDIR(mode) else "-"
         permissions = is_dir + "".join(
             (char if mode & mask else "-")
@@ -73,20 +140,26 @@ def get_file_info(file_path):
             )
         )
 
-        last_modified = time.localtime(os.path.getmtime(file_path))
+        last_modified = time.localtime(info.st_mtime)
         date = time.strftime("%d/%m/%Y", last_modified)
         time_formatted = time.strftime("%I:%M %p", last_modified)
 
-        if os.path.isdir(file_path):
-            folder_count, file_count = 0, 0
-            for root, dirs, files in os.walk(file_path):
-                folder_count += len(dirs)
-                file_count += len(files)
-                break
-            size = f"{folder_count} folder(s), {file_count} file(s)"
+        if stat.S_ISDIR(mode):
+            # The counts come from the folder's listing, which the prefetcher
+            # has usually read already.
+            try:
+                contents = listing_cache.get(file_path)
+                folder_count = contents.names.dir_count
+                file_count = len(contents.names) - folder_count
+                counted = contents.complete
+            except OSError:
+                folder_count, file_count, counted = 0, 0, True
+            size = f"{folder_count} folder(s), {file_count} file(s)" + ("" if counted else "...")
+            if dir_sizer is not None:
+                total_bytes, complete = dir_sizer.request(file_path, info.st_mtime_ns)
+                size += f", {format_size(total_bytes)}" + ("" if complete else "...")
         else:
-            file_size = os.path.getsize(file_path)
-            size = format_size(file_size)
+            size = format_size(info.st_size)
 
         return f"{permissions} {date} {time_formatted} {size}"
 
@@ -95,27 +168,134 @@ def get_file_info(file_path):
         return "Error retrieving file information."
 
 
-def display_files(stdscr, files, current_index, max_height, current_directory):
-    start_index = max(0, current_index - max_height + 1)
+def unused_copy_path(directory, source_path, taken=()):
+    base_name, extension = os.path.splitext(os.path.basename(source_path))
+    destination = os.path.join(directory, f"{base_name}-copy{extension}")
+
+    counter = 1
+    while os.path.exists(destination) or destination in taken:
+        new_name = f"{base_name}-copy ({counter}){extension}"
+        destination = os.path.join(directory, new_name)
+        counter += 1
+    return destination
+
+
+def display_files(stdscr, files, current_index, max_height, current_directory, scroll_offset=0, selection=()):
+    # The view only scrolls when the cursor would leave it; the first visible
+    # index is returned so the caller can keep it.
+    start_index = max(min(scroll_offset, current_index), current_index - max_height + 1)
+    start_index = max(0, min(start_index, len(files) - max_height))
     end_index = min(len(files), start_index + max_height)
 
     for index in range(start_index, end_index):
         file = files[index]
         full_path = os.path.join(current_directory, file)
-        color = curses.color_pair(2) if os.path.isdir(full_path) else curses.color_pair(3)
+        # Directory listings and content matches already know which entries
+        # are folders; name search results go through the stat cache.
+        known = files.is_dir_at(index) if hasattr(files, "is_dir_at") else None
+        is_dir = stat_cache.is_dir(full_path, known)
+        color = curses.color_pair(2) if is_dir else curses.color_pair(3)
+        mark = "*" if file in selection else " "
 
         if index == current_index:
-            if os.path.isdir(full_path):
-                stdscr.addstr(index - start_index + 1, 0, f"> {file}", color | curses.A_REVERSE | curses.A_BOLD)
+            if is_dir:
+                stdscr.addstr(index - start_index + 1, 0, f">{mark}{file}", color | curses.A_REVERSE | curses.A_BOLD)
             else:
-                stdscr.addstr(index - start_index + 1, 0, f"- {file}", color | curses.A_REVERSE | curses.A_BOLD)
+                stdscr.addstr(index - start_index + 1, 0, f"-{mark}{file}", color | curses.A_REVERSE | curses.A_BOLD)
         else:
-            stdscr.addstr(index - start_index + 1, 0, f"  {file}", color)
+            stdscr.addstr(index - start_index + 1, 0, f" {mark}{file}", color)
 
     if not files:
         stdscr.addstr(1, 0, "", curses.color_pair(1))
         stdscr.addstr(2, 0, "This directory is empty.", curses.color_pair(4))
 
+    return start_index
+
+
+def show_preview(stdscr, path, title, max_height, max_width, line=None):
+    import preview
+
+    document = preview.open_preview(path)
+    try:
+        scroll_x = 0
+        max_preview_height = max_height - 2
+        if line is not None and isinstance(document, preview.TextPreview):
+            # Shows a few lines above the one asked for.
+            document.goto(max(0, line - PREVIEW_CONTEXT_LINES), max_preview_height)
+
+        while True:
+            stdscr.erase()
+            stdscr.addstr(0, 0, f"Preview: {title} (SPACE to exit, ←/→ & ↑/↓ to scroll)"[: max_width - 1], curses.color_pair(1) | curses.A_BOLD)
+
+            for i, row in enumerate(document.rows(max_preview_height, scroll_x, max_width - 1)):
+                stdscr.addstr(i + 1, 0, row)
+
+            preview_status = f"{document.position()}  [PgUp/PgDn] Page, [Home/End] Jump, [G] Go to"
+            stdscr.addstr(max_height - 1, 0, preview_status[: max_width - 1], curses.color_pair(1))
+            stdscr.refresh()
+            preview_key = stdscr.getch()
+
+            if preview_key == ord(" ") or preview_key == 27:
+                break
+            elif preview_key == curses.KEY_DOWN:
+                document.scroll(1, max_preview_height)
+            elif preview_key == curses.KEY_UP:
+                document.scroll(-1, max_preview_height)
+            elif preview_key == curses.KEY_NPAGE:
+                document.scroll(max_preview_height, max_preview_height)
+            elif preview_key == curses.KEY_PPAGE:
+                document.scroll(-max_preview_height, max_preview_height)
+            elif preview_key == curses.KEY_HOME:
+                document.home()
+            elif preview_key == curses.KEY_END:
+                document.end(max_preview_height)
+            elif preview_key == curses.KEY_RIGHT:
+                scroll_x += 5
+            elif preview_key == curses.KEY_LEFT and scroll_x > 0:
+                scroll_x -= 5
+            elif preview_key in [ord("g"), ord("G")]:
+                stdscr.move(max_height - 1, 0)
+                stdscr.clrtoeol()
+                stdscr.addstr(max_height - 1, 0, document.goto_prompt, curses.A_BOLD)
+                curses.echo()
+                curses.curs_set(1)
+                target = stdscr.getstr(max_height - 1, len(document.goto_prompt), 20)
+                curses.noecho()
+                curses.curs_set(0)
+                target = document.parse_target(target.decode("utf-8").strip())
+                if target is not None:
+                    document.goto(target, max_preview_height)
+    finally:
+        document.close()
+
+
+def duplicate_rows(groups, directory, removed=()):
+    # Files in `removed` are left out, and so are groups with one file left.
+    import dupes
+
+    rows = dupes.GroupRows()
+    for size, paths in groups:
+        paths = [path for path in paths if path not in removed]
+        if len(paths) < 2:
+            continue
+        rows.add(f"{len(paths)} copies of {format_size(size)}, {format_size(size * (len(paths) - 1))} wasted")
+        rows.wasted_bytes += size * (len(paths) - 1)
+        for path in paths:
+            rows.add(f"  {os.path.relpath(path, start=directory)}", path)
+    return rows
+
+
+def usage_rows(children, total_bytes, width):
+    import usage
+
+    labels = []
+    for name, size, is_dir in children:
+        share = size / total_bytes if total_bytes else 0.0
+        bar = "#" * round(share * USAGE_BAR_WIDTH)
+        label = f"{format_size(size):>13} {share * 100:5.1f}% [{bar:<{USAGE_BAR_WIDTH}}] {name}{os.sep if is_dir else ''}"
+        labels.append(label[:width])
+    return usage.UsageRows(labels, children)
+
 
 def validate_directory(directory):
     if not os.path.exists(directory):
@@ -123,30 +303,128 @@ def validate_directory(directory):
         sys.exit(1)
 
 
+def filesystem_calls():
+    listings = listing_cache.counters()
+    return {
+        "stat": stat_cache.calls,
+        "dir_check": listings["checks"],
+        "scandir": listings["misses"],
+        "listing_hit": listings["hits"],
+    }
+
+
 def main(stdscr, directories):
     curses.curs_set(0)
     curses.start_color()
     curses.use_default_colors()
     colors.init_colors()
-    tab_stack = directories
-    current_directory = tab_stack[0]
+    tab_stack = [tabs.Tab(directory) for directory in directories]
     current_tab_index = 0
-    current_index = 0
-    history = [current_directory]
-    history_index = 0
+    current_directory, current_index, scroll_offset, history, history_index = tab_stack[0].restore()
     selected_path = None
     error_message = ""
     show_error = False
     last_action = None
     copied_path = None
     cut_path = None
+    # Names marked in selection_directory; a copy, cut or delete then acts on
+    # all of them as one batch. clipboard_items holds a copied/cut batch.
+    selection = set()
+    selection_directory = None
+    # (directory, listing) while the first chunk of a large directory is shown.
+    partial_shown = None
+    clipboard_items = None
     undo_stack = []
     redo_stack = []
     indicator = "_"
+    renderer = render.Renderer(stdscr)
+    # Built by the first paste or delete; until then no job can be running.
+    job_queue = None
+    dir_sizer = dirsize.DirSizer()
+    directory_watcher = watcher.DirectoryWatcher()
+    tab_refresher = tabs.TabRefresher(listing_cache)
+    prefetcher = listing.Prefetcher(listing_cache)
+    # Started once the first frame is up.
+    trash_purger = None
+    frame_profiler = profiler.FrameProfiler(f"{LOG_NAME}.trace.jsonl" if PROFILE_FRAMES else None, filesystem_calls)
+
+    def jobs():
+        nonlocal job_queue
+        if job_queue is None:
+            import fileops
+
+            job_queue = fileops.JobQueue(FILE_OPERATION_WORKERS)
+        return job_queue
+
+    def purger():
+        nonlocal trash_purger
+        if trash_purger is None:
+            import trash
+
+            trash_purger = trash.TrashPurger(
+                TRASH_MAX_BYTES,
+                TRASH_MAX_AGE_DAYS,
+                lambda: [path for job in job_queue.active() for path in job.paths()] if job_queue is not None else [],
+            )
+        return trash_purger
+
+    def remove_paths(targets, to_trash):
+        # Moves targets to the trash as one undoable step, or queues their
+        # permanent deletion. Returns an error message if that failed, and
+        # the background job if the removal is still running.
+        nonlocal indicator
+        import fileops
+        import trash
+
+        if not to_trash:
+            job = jobs().submit(
+                fileops.Job(
+                    "delete",
+                    targets[0] if len(targets) == 1 else None,
+                    items=[(path, None) for path in targets] if len(targets) > 1 else None,
+                    failure_message="Error: Unable to delete the file or directory.",
+                )
+            )
+            indicator = "_"
+            return None, job
+        job = None
+        try:
+            items, pending = trash.trash_paths(targets)
+            if len(items) == 1:
+                entry = {"action": "trash", "src": items[0][0], "dst": items[0][1]}
+            else:
+                entry = {"action": "trash-batch", "items": items}
+            if pending:
+                job = jobs().submit(
+                    fileops.Job(
+                        "move",
+                        None,
+                        items=pending,
+                        record=("undo", entry),
+                        fast_copy=FAST_COPY_MODE,
+                        failure_message="Error: Unable to move the item to the trash.",
+                    )
+                )
+            else:
+                for path in targets:
+                    listing_cache.invalidate(os.path.dirname(path))
+                    stat_cache.invalidate(os.path.dirname(path))
+                    dir_sizer.cache.invalidate(path)
+                undo_stack.append(entry)
+                indicator = "Z"
+            redo_stack.clear()
+            purger().wake()
+        except PermissionError:
+            return "Error: Insufficient permissions to move the item to the trash.", None
+        except Exception as e:
+            log_error(e)
+            return "Error: Unable to move the item to the trash.", None
+        return None, job
 
     max_height, max_width = stdscr.getmaxyx()
 
     while True:
+        frame_profiler.begin_frame()
         min_height, min_width = 15, 48
         max_height, max_width = stdscr.getmaxyx()
 
@@ -155,51 +433,175 @@ def main(stdscr, directories):
             print(f"Minimum size required: {min_width}x{min_height}")
             exit(1)
 
-        stdscr.clear()
+        finished_jobs = job_queue.drain() if job_queue is not None else []
+        for job in finished_jobs:
+            for path in job.paths():
+                dir_sizer.cache.invalidate(path)
+            if job.state == "done" and not job.undoable:
+                error_message = f"{job.name} was overwritten without a backup, so this cannot be undone."
+                show_error = True
+            elif job.state == "done" and job.record:
+                stack_name, entry = job.record
+                if stack_name == "undo":
+                    undo_stack.append(entry)
+                    indicator = "Z"
+                else:
+                    redo_stack.append(entry)
+                    indicator = "Y"
+            elif job.state == "failed":
+                log_error(job.error)
+                error_message = describe_job_error(job)
+                show_error = True
+            elif job.state == "cancelled":
+                error_message = f"{job.label} {job.name} cancelled."
+                show_error = True
+        frame_profiler.mark("jobs")
+
+        tab_directories = [tab.directory for index, tab in enumerate(tab_stack) if index != current_tab_index]
+        directory_watcher.watch([current_directory] + tab_directories)
+        listing_cache.set_watched(directory_watcher.live)
+        stat_cache.set_watched(listing_cache.watched)
+        stat_cache.refresh()
+        tab_refresher.track(tab_directories)
+
+        changed_directories = directory_watcher.drain()
+        for path in changed_directories:
+            listing_cache.invalidate(path)
+            stat_cache.invalidate(path)
+            dir_sizer.cache.invalidate(path)
+        if changed_directories:
+            tab_refresher.wake()
+        frame_profiler.mark("watch")
+
+        if selection_directory != current_directory:
+            selection.clear()
+            selection_directory = current_directory
+
+        files, error_loading = list_files(current_directory)
+        loading_count = listing_cache.loading(current_directory)
+        # The first chunk is sorted on its own, so once the complete listing
+        # replaces it the same index holds another entry; the cursor follows
+        # the highlighted name instead.
+        if partial_shown is not None and partial_shown[0] == current_directory and files and files is not partial_shown[1]:
+            shown = partial_shown[1]
+            position = files.find(shown[current_index]) if current_index < len(shown) else -1
+            if position >= 0:
+                current_index = position
+        partial_shown = (current_directory, files) if loading_count is not None and files else None
+        active_jobs = job_queue.active() if job_queue is not None else []
+        list_height = max_height - 3 if active_jobs or loading_count is not None else max_height - 2
+        frame_profiler.mark("list")
+
+        renderer.begin()
         max_display_width = max_width - len("Current Directory: ") - 3
+        if frame_profiler.enabled:
+            overlay = frame_profiler.overlay()[: max_width // 2]
+            max_display_width -= len(overlay) + 1
+            renderer.addstr(0, max_width - len(overlay) - 1, overlay, curses.color_pair(4) | curses.A_BOLD)
 
         if len(current_directory) > max_display_width:
             truncated_directory = "..." + current_directory[-max_display_width:]
         else:
             truncated_directory = current_directory
 
-        stdscr.addstr(0, 0, "Current Directory: ", curses.color_pair(1))
-        stdscr.addstr(0, len("Current Directory: "), truncated_directory, curses.color_pair(2))
-        files, error_loading = list_files(current_directory)
+        renderer.addstr(0, 0, "Current Directory: ", curses.color_pair(1))
+        renderer.addstr(0, len("Current Directory: "), truncated_directory, curses.color_pair(2))
 
         if error_loading:
             error_message = error_loading
             show_error = True
 
-        display_files(stdscr, files, current_index, max_height - 2, current_directory)
-
+        current_index = min(current_index, len(files) - 1) if files else 0
+        scroll_offset = display_files(renderer, files, current_index, list_height, current_directory, scroll_offset, selection)
+
+        if active_jobs:
+            job_progress = format_job_progress(active_jobs[0], len(active_jobs) - 1)
+            renderer.addstr(max_height - 2, 0, job_progress[: max_width - 1], curses.color_pair(4) | curses.A_BOLD)
+        elif loading_count is not None:
+            loading_progress = f"Loading: {loading_count:,} entries read, showing the first {len(files):,}..."
+            renderer.addstr(max_height - 2, 0, loading_progress[: max_width - 1], curses.color_pair(4) | curses.A_BOLD)
+        frame_profiler.mark("files")
+
+        # The keys below act on selected_path, so it is set whatever the
+        # status bar ends up showing.
+        selected_path = os.path.join(current_directory, files[current_index]) if files else None
+        dir_sizer.follow(selected_path)
+        sizer_error = dir_sizer.take_error()
+        if sizer_error is not None:
+            log_error(sizer_error)
         if show_error and error_message:
-            stdscr.addstr(max_height - 1, 0, error_message[: max_width - 1], curses.color_pair(5) | curses.A_BOLD)
+            renderer.addstr(max_height - 1, 0, error_message[: max_width - 1], curses.color_pair(5) | curses.A_BOLD)
+        elif selection:
+            selection_info = f"{len(selection)} selected: [c] Copy, [x] Cut, [DEL] Delete, [a] Select all/none"
+            renderer.addstr(max_height - 1, 0, selection_info[: max_width - 5], curses.color_pair(2) | curses.A_BOLD)
+            renderer.addstr(max_height - 1, max_width - 4, f"[{indicator}]", curses.color_pair(1) | curses.A_BOLD)
         elif files:
-            selected_item = files[current_index]
-            selected_path = os.path.join(current_directory, selected_item)
-            file_info = get_file_info(selected_path)
-            usable_width = max_width - 4
+            file_info = get_file_info(selected_path, dir_sizer)
+            usable_width = max_width - 5
             truncated_info = file_info[:usable_width]
-            permissions, rest_info = file_info.split(" ", 1)
-            stdscr.addstr(max_height - 1, 0, permissions, curses.color_pair(2) | curses.A_BOLD)
-            stdscr.addstr(max_height - 1, len(permissions) + 1, rest_info, curses.A_BOLD)
-            stdscr.addstr(max_height - 1, max_width - 4, f"[{indicator}]", curses.color_pair(1) | curses.A_BOLD)
-
-        stdscr.refresh()
+            permissions, rest_info = truncated_info.split(" ", 1)
+            renderer.addstr(max_height - 1, 0, permissions, curses.color_pair(2) | curses.A_BOLD)
+            renderer.addstr(max_height - 1, len(permissions) + 1, rest_info, curses.A_BOLD)
+            renderer.addstr(max_height - 1, max_width - 4, f"[{indicator}]", curses.color_pair(1) | curses.A_BOLD)
+        frame_profiler.mark("status")
+
+        renderer.flush()
+        frame_profiler.mark("flush")
+
+        # Read ahead the highlighted folder and the parent, the two places
+        # the arrow keys can go next.
+        prefetch = [os.path.dirname(current_directory)]
+        if files and files.is_dir_at(current_index):
+            prefetch.insert(0, os.path.join(current_directory, files[current_index]))
+        prefetcher.request(prefetch, keep=[current_directory])
+        # The startup purge of the trash waits until the first frame is up.
+        if trash_purger is None:
+            purger().wake()
+        frame_profiler.mark("prefetch")
+
+        # While idle, wake up only to see whether a watched directory changed;
+        # the screen is redrawn once the change has settled.
+        background_work = active_jobs or dir_sizer.busy() or loading_count is not None
+        stdscr.timeout(JOB_REFRESH_MS if background_work else WATCH_REFRESH_MS)
         key = stdscr.getch()
+        while key == -1 and not (background_work or directory_watcher.ready()):
+            key = stdscr.getch()
+        stdscr.timeout(-1)
+        frame_profiler.mark("wait")
+
+        # Anything other than plain cursor movement may draw prompts straight
+        # onto the status row, so the renderer can no longer trust it.
+        if key not in [-1, curses.KEY_UP, curses.KEY_DOWN]:
+            renderer.forget_row(max_height - 1)
 
         if key in [curses.KEY_RIGHT, curses.KEY_LEFT, curses.KEY_UP, curses.KEY_DOWN]:
             show_error = False
 
-        if key == 27:
+        if key == -1:
+            continue
+        elif key == 27:
+            if job_queue is not None and job_queue.active():
+                stdscr.move(max_height - 1, 0)
+                stdscr.clrtoeol()
+                stdscr.addstr(max_height - 1, 0, "File operations are still running. Exit anyway? [y] Yes, [n] No: ", curses.A_BOLD)
+                stdscr.refresh()
+
+                user_input = stdscr.getch()
+                while user_input not in [ord("y"), ord("n")]:
+                    user_input = stdscr.getch()
+
+                if user_input == ord("n"):
+                    continue
             break
+        elif key == ord("k"):
+            cancelled_job = job_queue.cancel_current() if job_queue is not None else None
+            if cancelled_job is None:
+                show_error = False
+                continue
         elif key == 9:
-            tab_stack[current_tab_index] = current_directory
+            tab_stack[current_tab_index].save(current_directory, current_index, scroll_offset, history, history_index)
             current_tab_index = (current_tab_index + 1) % len(tab_stack)
-            current_directory = tab_stack[current_tab_index]
-            history = [current_directory]
-            current_index = 0 if len(tab_stack) > 1 else current_index
+            current_directory, current_index, scroll_offset, history, history_index = tab_stack[current_tab_index].restore()
         elif key == ord("+"):
             show_error = False
             stdscr.addstr(max_height - 1, 0, "Enter a directory path: ", curses.A_BOLD)
@@ -220,23 +622,19 @@ def main(stdscr, directories):
 
             new_path = new_path.decode("utf-8")
             if os.path.isdir(new_path):
-                tab_stack[current_tab_index] = current_directory
-                tab_stack.append(new_path)
+                tab_stack[current_tab_index].save(current_directory, current_index, scroll_offset, history, history_index)
+                tab_stack.append(tabs.Tab(new_path))
                 current_tab_index = len(tab_stack) - 1
-                current_directory = new_path
-                history = [current_directory]
-                current_index = 0
+                current_directory, current_index, scroll_offset, history, history_index = tab_stack[current_tab_index].restore()
             else:
                 error_message = "Invalid directory path!"
                 show_error = True
         elif ord("1") <= key <= ord("9"):
             tab_index = key - ord("1")
             if tab_index < len(tab_stack):
-                tab_stack[current_tab_index] = current_directory
+                tab_stack[current_tab_index].save(current_directory, current_index, scroll_offset, history, history_index)
                 current_tab_index = tab_index
-                current_directory = tab_stack[current_tab_index]
-                history = [current_directory]
-                current_index = 0 if len(tab_stack) > 1 else current_index
+                current_directory, current_index, scroll_offset, history, history_index = tab_stack[current_tab_index].restore()
             else:
                 show_error = False
                 continue
@@ -244,7 +642,7 @@ def main(stdscr, directories):
             if files:
                 selected = files[current_index]
                 new_path = os.path.join(current_directory, selected)
-                if os.path.isdir(new_path):
+                if stat_cache.is_dir(new_path, files.is_dir_at(current_index)):
                     if history_index < len(history) - 1:
                         history = history[: history_index + 1]
                     history.append(new_path)
@@ -257,7 +655,6 @@ def main(stdscr, directories):
                 history.append(parent_directory)
                 history_index += 1
                 current_directory = parent_directory
-                tab_stack[current_tab_index] = current_directory
                 parent_files, _ = list_files(current_directory)
                 prev_folder_name = (os.path.basename(history[-2]) if len(history) > 1 else None)
                 current_index = (
@@ -269,11 +666,15 @@ def main(stdscr, directories):
             current_index = (current_index + 1) % len(files) if files else 0
         elif key == curses.KEY_UP:
             current_index = (current_index - 1) % len(files) if files else 0
-        elif key == curses.KEY_DC:
+        elif key in [curses.KEY_DC, curses.KEY_SDC]:
             if files:
+                to_trash = DELETE_TO_TRASH and key == curses.KEY_DC
+                targets = [os.path.join(current_directory, name) for name in sorted(selection)] or [selected_path]
+                what = f"{len(targets)} selected items" if len(targets) > 1 else "selected item"
+                prompt = f"Move {what} to trash?" if to_trash else f"Permanently delete {what}?"
                 stdscr.move(max_height - 1, 0)
                 stdscr.clrtoeol()
-                stdscr.addstr(max_height - 1, 0, "Delete selected item? [y] Yes, [n] No: ",curses.A_BOLD,)
+                stdscr.addstr(max_height - 1, 0, f"{prompt} [y] Yes, [n] No: ",curses.A_BOLD,)
                 stdscr.refresh()
 
                 user_input = stdscr.getch()
@@ -281,31 +682,15 @@ def main(stdscr, directories):
                     user_input = stdscr.getch()
 
                 if user_input == ord("y"):
-                    try:
-                        if os.path.isdir(selected_path):
-                            shutil.rmtree(selected_path)
-                        else:
-                            os.remove(selected_path)
-                        files.pop(current_index)
-                        current_index = max(0, current_index - 1)
-                        indicator = "_"
-                    except FileNotFoundError:
-                        error_message = "Error: File or directory not found."
-                        show_error = True
-                    except PermissionError:
-                        error_message = ("Error: Insufficient permissions to delete this item.")
+                    failure, _ = remove_paths(targets, to_trash)
+                    if failure:
+                        error_message = failure
                         show_error = True
-                    except Exception as e:
-                        log_error(e)
-                        error_message = f"Unexpected error: {str(e)}"
-                        show_error = True
-
-                if show_error:
-                    stdscr.move(max_height - 1, 0)
-                    stdscr.clrtoeol()
-                    stdscr.addstr(max_height - 1, 0, error_message, curses.color_pair(1))
-                    stdscr.refresh()
+                    else:
+                        selection.clear()
         elif key == ord("p"):
+            import pyperclip
+
             selected_item = files[current_index] if files else ""
             selected_path = os.path.join(current_directory, selected_item)
             try:
@@ -316,6 +701,8 @@ def main(stdscr, directories):
                 error_message = "Clipboard Error: Unable to copy the path."
                 show_error = True
         elif key == 10:
+            import subprocess
+
             if selected_path and os.path.exists(selected_path):
                 try:
                     if sys.platform == "win32":
@@ -328,17 +715,94 @@ def main(stdscr, directories):
                     log_error(e)
                     error_message = "Error opening file. Check logs for details."
                     show_error = True
+        elif key == ord("s"):
+            if files:
+                selection.symmetric_difference_update([files[current_index]])
+                current_index = (current_index + 1) % len(files)
+        elif key == ord("a"):
+            if files and len(selection) < len(files):
+                selection.update(files)
+            else:
+                selection.clear()
+        elif key == ord("*"):
+            import fnmatch
+
+            stdscr.move(max_height - 1, 0)
+            stdscr.clrtoeol()
+            stdscr.addstr(max_height - 1, 0, "Select matching: ", curses.A_BOLD)
+            curses.echo()
+            curses.curs_set(1)
+            pattern = stdscr.getstr(max_height - 1, len("Select matching: "), max_width - len("Select matching: "))
+            curses.noecho()
+            curses.curs_set(0)
+            pattern = pattern.decode("utf-8").strip()
+            if pattern:
+                selection.update(fnmatch.filter(files, pattern))
+            show_error = False
         elif key == ord("c"):
             copied_path = selected_path
+            clipboard_items = [os.path.join(current_directory, name) for name in sorted(selection)] or None
+            selection.clear()
             last_action = "copy"
             cut_path = None
             indicator = "C"
         elif key == ord("x"):
             cut_path = selected_path
+            clipboard_items = [os.path.join(current_directory, name) for name in sorted(selection)] or None
+            selection.clear()
             last_action = "cut"
             copied_path = None
             indicator = "X"
+        elif key == ord("v") and last_action in ["copy", "cut"] and clipboard_items:
+            import fileops
+
+            items, conflicts, taken = [], [], set()
+            for source_path in clipboard_items:
+                destination = os.path.join(current_directory, os.path.basename(source_path))
+                if os.path.abspath(source_path) == os.path.abspath(destination):
+                    # Cutting into the same folder leaves the item where it is.
+                    if last_action == "copy":
+                        destination = unused_copy_path(current_directory, source_path, taken)
+                    else:
+                        continue
+                elif os.path.lexists(destination):
+                    conflicts.append(source_path)
+                    continue
+                items.append((source_path, destination))
+                taken.add(destination)
+
+            if conflicts:
+                stdscr.addstr(max_height - 1, 0, f"{len(conflicts)} item(s) already exist. [k] Keep both, [s] Skip them, [c] Cancel: ", curses.A_BOLD)
+                stdscr.refresh()
+                user_input = stdscr.getch()
+                while user_input not in [ord("k"), ord("s"), ord("c")]:
+                    user_input = stdscr.getch()
+
+                if user_input == ord("c"):
+                    show_error = False
+                    continue
+                if user_input == ord("k"):
+                    for source_path in conflicts:
+                        destination = unused_copy_path(current_directory, source_path, taken)
+                        items.append((source_path, destination))
+                        taken.add(destination)
+
+            if items:
+                jobs().submit(
+                    fileops.Job(
+                        "move" if last_action == "cut" else "copy",
+                        None,
+                        items=items,
+                        record=("undo", {"action": f"{last_action}-batch", "items": items}),
+                        fast_copy=FAST_COPY_MODE,
+                        failure_message="Error: Unable to move or copy the selected items.",
+                    )
+                )
+                redo_stack.clear()
+            show_error = False
         elif key == ord("v"):
+            import fileops
+
             if last_action in ["copy", "cut"]:
                 source_path = copied_path if last_action == "copy" else cut_path
                 destination = os.path.join(current_directory, os.path.basename(source_path))
@@ -361,30 +825,20 @@ def main(stdscr, directories):
                         show_error = False
                         continue
                 elif last_action == "copy" and os.path.abspath(source_path) == os.path.abspath(destination):
-                    base_name, extension = os.path.splitext(os.path.basename(source_path))
-                    new_name = f"{base_name}-copy{extension}"
-                    destination = os.path.join(current_directory, new_name)
-
-                    counter = 1
-                    while os.path.exists(destination):
-                        new_name = f"{base_name}-copy ({counter}){extension}"
-                        destination = os.path.join(current_directory, new_name)
-                        counter += 1
-
-                    try:
-                        if os.path.isdir(source_path):
-                            shutil.copytree(source_path, destination)
-                        else:
-                            shutil.copy2(source_path, destination)
-
-                        undo_stack.append({"action": "copy", "src": source_path, "dst": destination})
-                        redo_stack.clear()
-                        indicator = "Z"
-                        show_error = False
-                    except Exception as e:
-                        log_error(e)
-                        error_message = "Error: Unable to copy the file or directory."
-                        show_error = True
+                    destination = unused_copy_path(current_directory, source_path)
+
+                    jobs().submit(
+                        fileops.Job(
+                            "copy",
+                            source_path,
+                            destination,
+                            record=("undo", {"action": "copy", "src": source_path, "dst": destination}),
+                            fast_copy=FAST_COPY_MODE,
+                            failure_message="Error: Unable to copy the file or directory.",
+                        )
+                    )
+                    redo_stack.clear()
+                    show_error = False
                 elif os.path.abspath(source_path) != os.path.abspath(destination):
                     if os.path.exists(destination):
                         user_input = prompt_user(
@@ -393,75 +847,61 @@ def main(stdscr, directories):
                         )
 
                         if user_input == ord("o"):
-                            try:
-                                if os.path.isdir(source_path):
-                                    shutil.copytree(source_path, destination, dirs_exist_ok=True)
-                                else:
-                                    shutil.copy2(source_path, destination)
-
-                                if last_action == "cut":
-                                    os.remove(source_path)
-
-                                undo_stack.append(
-                                    {
-                                        "action": last_action,
-                                        "src": source_path,
-                                        "dst": destination,
-                                    }
+                            backup = fileops.backup_path(destination)
+                            jobs().submit(
+                                fileops.Job(
+                                    "move" if last_action == "cut" else "copy",
+                                    source_path,
+                                    destination,
+                                    overwrite=True,
+                                    record=(
+                                        "undo",
+                                        {
+                                            "action": "overwrite",
+                                            "src": source_path,
+                                            "dst": destination,
+                                            "cut": last_action == "cut",
+                                            "backup": backup,
+                                        },
+                                    ),
+                                    fast_copy=FAST_COPY_MODE,
+                                    backup=backup,
+                                    failure_message="Error: Unable to overwrite the file or directory.",
                                 )
-
-                                redo_stack.clear()
-                                indicator = "Z"
-                                show_error = False
-                            except Exception as e:
-                                log_error(e)
-                                error_message = ("Error: Unable to overwrite the file or directory.")
-                                show_error = True
+                            )
+                            redo_stack.clear()
+                            show_error = False
                         elif user_input == ord("k"):
-                            base_name, extension = os.path.splitext(os.path.basename(source_path))
-                            destination = os.path.join(current_directory, f"{base_name}-copy{extension}")
-
-                            counter = 1
-                            while os.path.exists(destination):
-                                new_name = f"{base_name}-copy ({counter}){extension}"
-                                destination = os.path.join(current_directory, new_name)
-                                counter += 1
-
-                            try:
-                                if os.path.isdir(source_path):
-                                    shutil.copytree(source_path, destination)
-                                else:
-                                    shutil.copy2(source_path, destination)
-
-                                undo_stack.append({"action": "copy", "src": source_path, "dst": destination,})
-                                redo_stack.clear()
-                                indicator = "Z"
-                                show_error = False
-                            except Exception as e:
-                                log_error(e)
-                                error_message = ("Error: Unable to copy. Check logs for details.")
-                                show_error = True
+                            destination = unused_copy_path(current_directory, source_path)
+
+                            jobs().submit(
+                                fileops.Job(
+                                    "copy",
+                                    source_path,
+                                    destination,
+                                    record=("undo", {"action": "copy", "src": source_path, "dst": destination}),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Error: Unable to copy. Check logs for details.",
+                                )
+                            )
+                            redo_stack.clear()
+                            show_error = False
                         elif user_input == ord("c"):
                             show_error = False
                             continue
                     else:
-                        try:
-                            if last_action == "cut":
-                                shutil.move(source_path, destination)
-                            else:
-                                if os.path.isdir(source_path):
-                                    shutil.copytree(source_path, destination)
-                                else:
-                                    shutil.copy2(source_path, destination)
-
-                            undo_stack.append({"action": last_action, "src": source_path, "dst": destination,})
-                            redo_stack.clear()
-                            indicator = "Z"
-                            show_error = False
-                        except Exception as e:
-                            log_error(e)
-                            error_message = ("Error: Unable to move or copy the file or directory.")
-                            show_error = True
+                        jobs().submit(
+                            fileops.Job(
+                                "move" if last_action == "cut" else "copy",
+                                source_path,
+                                destination,
+                                record=("undo", {"action": last_action, "src": source_path, "dst": destination}),
+                                fast_copy=FAST_COPY_MODE,
+                                failure_message="Error: Unable to move or copy the file or directory.",
+                            )
+                        )
+                        redo_stack.clear()
+                        show_error = False
         elif key == curses.KEY_F2:
             if files:
                 selected_item = files[current_index]
@@ -495,7 +935,7 @@ def main(stdscr, directories):
                     new_path = os.path.join(current_directory, new_name)
                     try:
                         os.rename(selected_path, new_path)
-                        files[current_index] = new_name
+                        listing_cache.invalidate(current_directory)
                         undo_stack.append({"action": "rename", "src": selected_path, "dst": new_path})
                         redo_stack.clear()
                         indicator = "Z"
@@ -519,12 +959,16 @@ def main(stdscr, directories):
                 stdscr.move(max_height - 1, 0)
                 stdscr.clrtoeol()
         elif key == ord("z"):
+            import fileops
+            import trash
+
             if undo_stack:
                 last_action = undo_stack.pop()
+                show_error = False
                 try:
                     action_type = last_action["action"]
-                    src = last_action["src"]
-                    dst = last_action["dst"]
+                    src = last_action.get("src")
+                    dst = last_action.get("dst")
                     if action_type == "rename":
                         if os.path.exists(dst):
                             os.rename(dst, src)
@@ -536,23 +980,119 @@ def main(stdscr, directories):
                         if os.path.abspath(src) == os.path.abspath(dst):
                             redo_stack.append({"action": "copy", "src": src, "dst": dst})
                         elif os.path.exists(dst):
-                            if os.path.isdir(dst):
-                                shutil.rmtree(dst)
-                            else:
-                                os.remove(dst)
-                            redo_stack.append({"action": "copy", "src": src, "dst": dst})
+                            jobs().submit(
+                                fileops.Job(
+                                    "delete",
+                                    dst,
+                                    record=("redo", {"action": "copy", "src": src, "dst": dst}),
+                                    failure_message="Unable to undo the last operation. Check logs for details.",
+                                )
+                            )
                         else:
                             error_message = ("Error: Destination file or directory not found.")
                             show_error = True
                     elif action_type == "cut":
                         if os.path.exists(dst):
-                            os.rename(dst, src)
-                            redo_stack.append({"action": "cut", "src": src, "dst": dst})
+                            jobs().submit(
+                                fileops.Job(
+                                    "move",
+                                    dst,
+                                    src,
+                                    record=("redo", {"action": "cut", "src": src, "dst": dst}),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Unable to undo the last operation. Check logs for details.",
+                                )
+                            )
                         else:
                             error_message = ("Error: Destination file or directory not found.")
                             show_error = True
+                    elif action_type == "copy-batch":
+                        copies = [(copy, None) for _, copy in last_action["items"] if os.path.lexists(copy)]
+                        if copies:
+                            jobs().submit(
+                                fileops.Job(
+                                    "delete",
+                                    None,
+                                    items=copies,
+                                    record=("redo", last_action),
+                                    failure_message="Unable to undo the last operation. Check logs for details.",
+                                )
+                            )
+                        else:
+                            error_message = "Error: Destination file or directory not found."
+                            show_error = True
+                    elif action_type == "cut-batch":
+                        jobs().submit(
+                            fileops.Job(
+                                "move",
+                                None,
+                                items=[(moved, original) for original, moved in last_action["items"]],
+                                record=("redo", last_action),
+                                fast_copy=FAST_COPY_MODE,
+                                failure_message="Unable to undo the last operation. Check logs for details.",
+                            )
+                        )
+                    elif action_type == "trash-batch":
+                        pending = trash.restore_paths(last_action["items"])
+                        if pending:
+                            jobs().submit(
+                                fileops.Job(
+                                    "move",
+                                    None,
+                                    items=pending,
+                                    record=("redo", last_action),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Unable to undo the last operation. Check logs for details.",
+                                )
+                            )
+                        else:
+                            for original, _ in last_action["items"]:
+                                listing_cache.invalidate(os.path.dirname(original))
+                                stat_cache.invalidate(os.path.dirname(original))
+                                dir_sizer.cache.invalidate(original)
+                            redo_stack.append(last_action)
+                    elif action_type == "trash":
+                        if os.path.lexists(src):
+                            error_message = "Error: An item with the original name already exists."
+                            show_error = True
+                        elif not os.path.lexists(dst):
+                            error_message = "Error: The deleted item is no longer in the trash."
+                            show_error = True
+                        elif trash.restore_path(dst, src):
+                            listing_cache.invalidate(os.path.dirname(src))
+                            stat_cache.invalidate(os.path.dirname(src))
+                            dir_sizer.cache.invalidate(src)
+                            redo_stack.append({"action": "trash", "src": src, "dst": dst})
+                        else:
+                            jobs().submit(
+                                fileops.Job(
+                                    "move",
+                                    dst,
+                                    src,
+                                    record=("redo", {"action": "trash", "src": src, "dst": dst}),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Unable to undo the last operation. Check logs for details.",
+                                )
+                            )
+                    elif action_type == "overwrite":
+                        if last_action["backup"] and os.path.exists(last_action["backup"]):
+                            jobs().submit(
+                                fileops.Job(
+                                    "restore",
+                                    last_action["backup"],
+                                    dst,
+                                    displace_to=src if last_action["cut"] else None,
+                                    record=(
+                                        "redo",
+                                        {"action": "overwrite", "src": src, "dst": dst, "cut": last_action["cut"]},
+                                    ),
+                                    failure_message="Unable to undo the last operation. Check logs for details.",
+                                )
+                            )
+                        else:
+                            error_message = "Error: The overwritten item's backup is missing."
+                            show_error = True
                     indicator = "Y"
-                    show_error = False
                 except Exception as e:
                     log_error(e)
                     error_message = (f"Unable to undo the last operation. Check logs for details.")
@@ -561,12 +1101,16 @@ def main(stdscr, directories):
                 show_error = False
                 continue
         elif key == ord("y"):
+            import fileops
+            import trash
+
             if redo_stack:
                 last_action = redo_stack.pop()
+                show_error = False
                 try:
                     action_type = last_action["action"]
-                    src = last_action["src"]
-                    dst = last_action["dst"]
+                    src = last_action.get("src")
+                    dst = last_action.get("dst")
                     if action_type == "rename":
                         if os.path.exists(src):
                             os.rename(src, dst)
@@ -576,33 +1120,107 @@ def main(stdscr, directories):
                             show_error = True
                     elif action_type == "copy":
                         if not os.path.exists(dst):
-                            try:
-                                if os.path.isdir(src):
-                                    shutil.copytree(src, dst)
-                                else:
-                                    shutil.copy2(src, dst)
-                                undo_stack.append({"action": "copy", "src": src, "dst": dst})
-                            except Exception as e:
-                                log_error(e)
-                                error_message = "Error: Unable to redo copy operation. Check logs for details."
-                                show_error = True
+                            jobs().submit(
+                                fileops.Job(
+                                    "copy",
+                                    src,
+                                    dst,
+                                    record=("undo", {"action": "copy", "src": src, "dst": dst}),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Error: Unable to redo copy operation. Check logs for details.",
+                                )
+                            )
                         else:
                             error_message = ("Error: Destination already exists for redo copy.")
                             show_error = True
                     elif action_type == "cut":
                         if os.path.exists(src):
-                            try:
-                                shutil.move(src, dst)
-                                undo_stack.append({"action": "cut", "src": src, "dst": dst})
-                            except Exception as e:
-                                log_error(e)
-                                error_message = "Error: Unable to redo cut operation. Check logs for details."
-                                show_error = True
+                            jobs().submit(
+                                fileops.Job(
+                                    "move",
+                                    src,
+                                    dst,
+                                    record=("undo", {"action": "cut", "src": src, "dst": dst}),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Error: Unable to redo cut operation. Check logs for details.",
+                                )
+                            )
+                        else:
+                            error_message = "Error: Source file or folder not found."
+                            show_error = True
+                    elif action_type in ["copy-batch", "cut-batch"]:
+                        jobs().submit(
+                            fileops.Job(
+                                "copy" if action_type == "copy-batch" else "move",
+                                None,
+                                items=last_action["items"],
+                                record=("undo", last_action),
+                                fast_copy=FAST_COPY_MODE,
+                                failure_message="Error: Unable to redo the batch operation. Check logs for details.",
+                            )
+                        )
+                    elif action_type == "trash-batch":
+                        items, pending = trash.trash_paths([original for original, _ in last_action["items"]])
+                        entry = {"action": "trash-batch", "items": items}
+                        if pending:
+                            jobs().submit(
+                                fileops.Job(
+                                    "move",
+                                    None,
+                                    items=pending,
+                                    record=("undo", entry),
+                                    fast_copy=FAST_COPY_MODE,
+                                    failure_message="Error: Unable to redo delete operation. Check logs for details.",
+                                )
+                            )
+                        else:
+                            for original, _ in items:
+                                listing_cache.invalidate(os.path.dirname(original))
+                                stat_cache.invalidate(os.path.dirname(original))
+                                dir_sizer.cache.invalidate(original)
+                            undo_stack.append(entry)
+                    elif action_type == "trash":
+                        if os.path.lexists(src):
+                            trashed, renamed = trash.trash_path(src)
+                            entry = {"action": "trash", "src": src, "dst": trashed}
+                            if renamed:
+                                listing_cache.invalidate(os.path.dirname(src))
+                                stat_cache.invalidate(os.path.dirname(src))
+                                dir_sizer.cache.invalidate(src)
+                                undo_stack.append(entry)
+                            else:
+                                jobs().submit(
+                                    fileops.Job(
+                                        "move",
+                                        src,
+                                        trashed,
+                                        record=("undo", entry),
+                                        fast_copy=FAST_COPY_MODE,
+                                        failure_message="Error: Unable to redo delete operation. Check logs for details.",
+                                    )
+                                )
+                        else:
+                            error_message = "Error: Source file or folder not found."
+                            show_error = True
+                    elif action_type == "overwrite":
+                        if os.path.exists(src):
+                            backup = fileops.backup_path(dst)
+                            jobs().submit(
+                                fileops.Job(
+                                    "move" if last_action["cut"] else "copy",
+                                    src,
+                                    dst,
+                                    overwrite=True,
+                                    record=("undo", {**last_action, "backup": backup}),
+                                    fast_copy=FAST_COPY_MODE,
+                                    backup=backup,
+                                    failure_message="Error: Unable to redo overwrite operation. Check logs for details.",
+                                )
+                            )
                         else:
                             error_message = "Error: Source file or folder not found."
                             show_error = True
                     indicator = "Z"
-                    show_error = False
                 except Exception as e:
                     log_error(e)
                     error_message = ("Unable to redo the last operation. Check logs for details.")
@@ -632,7 +1250,7 @@ def main(stdscr, directories):
                 try:
                     with open(new_file_path, "w") as f:
                         f.write("")
-                    files.append(new_file)
+                    listing_cache.invalidate(current_directory)
                 except PermissionError:
                     error_message = "Error: Insufficient permissions to create file."
                     show_error = True
@@ -659,7 +1277,7 @@ def main(stdscr, directories):
                 new_dir_path = os.path.join(current_directory, new_dir)
                 try:
                     os.makedirs(new_dir_path)
-                    files.append(new_dir)
+                    listing_cache.invalidate(current_directory)
                 except FileExistsError:
                     error_message = "Error: Directory already exists."
                     show_error = True
@@ -670,110 +1288,517 @@ def main(stdscr, directories):
                     log_error(e)
                     error_message = f"Unexpected error: {str(e)}"
                     show_error = True
-        elif key == ord("f"):
+        elif key in [ord("f"), ord("g")]:
             show_error = False
-            stdscr.addstr(max_height - 1, 0, "Enter search query: ", curses.color_pair(4) | curses.A_BOLD)
+            # [G] searches file contents; its results are (path, line, text).
+            in_contents = key == ord("g")
+            prompt = "Enter text to find in files: " if in_contents else "Enter search query: "
+            stdscr.addstr(max_height - 1, 0, prompt, curses.color_pair(4) | curses.A_BOLD)
             stdscr.refresh()
             stdscr.clrtoeol()
             curses.echo()
             curses.curs_set(1)
-            search_query = stdscr.getstr(
-                max_height - 1,
-                len("Enter search query: "),
-                max_width - len("Enter search query: "),
-            )
+            search_query = stdscr.getstr(max_height - 1, len(prompt), max_width - len(prompt))
             curses.noecho()
             curses.curs_set(0)
-            search_query = search_query.decode("utf-8").lower().strip()
+            search_query = search_query.decode("utf-8").strip()
 
             if search_query:
-                matched_files = []
-                for root, dirs, files in os.walk(current_directory):
-                    for file_name in files + dirs:
-                        if all(part.lower() in file_name.lower() for part in search_query.split()):
-                            matched_files.append(os.path.join(root, file_name))
-
-                if matched_files:
-                    files = [
-                        os.path.relpath(path, start=current_directory) for path in matched_files
-                    ]
-                    current_index = 0
-                    indicator = "_"
+                if in_contents:
+                    import grep
+
+                    search_job = grep.ContentSearchJob(
+                        current_directory,
+                        search_query,
+                        SEARCH_RESULT_LIMIT,
+                        CONTENT_SEARCH_PROCESSES,
+                    ).start()
+                else:
+                    import search
+
+                    search_query = search_query.lower()
+                    search_job = search.SearchJob(
+                        current_directory, search_query, SEARCH_RESULT_LIMIT, SEARCH_PROCESSES
+                    ).start()
+
+                def result_label(result):
+                    if not in_contents:
+                        return os.path.relpath(result, start=current_directory)
+                    path, line_number, text = result
+                    return f"{os.path.relpath(path, start=current_directory)}:{line_number + 1}: {text}"[: max_width - 3]
+
+                search_results = None
+                files = grep.MatchLabels() if in_contents else []
+                previous_index = current_index
+                current_index = 0
+                indicator = "_"
+                stdscr.timeout(SEARCH_REFRESH_MS)
+
+                while True:
+                    results = search_job.results
+                    if results is not search_results:
+                        selected_result = files[current_index] if files else None
+                        files[:] = [result_label(result) for result in results]
+                        search_results = results
+                        if selected_result in files:
+                            current_index = files.index(selected_result)
+                    elif len(files) < len(results):
+                        files.extend(result_label(result) for result in results[len(files) :])
+                    current_index = min(current_index, max(len(files) - 1, 0))
+
+                    if in_contents:
+                        found = f"{len(files)} lines in {search_job.files_searched:,} files read"
+                    else:
+                        found = f"{len(files)} found"
+                    if not search_job.done:
+                        status = f"{found}, searching... (ESC to stop)"
+                    elif search_job.cancelled:
+                        status = f"{found}, stopped"
+                    elif search_job.truncated:
+                        status = f"{found}, limit reached"
+                    else:
+                        status = found
+
+                    stdscr.erase()
+                    stdscr.addstr(0, 0, f"Search Results for '{search_query}': {status}"[: max_width - 1])
 
-                    while True:
-                        stdscr.clear()
-                        stdscr.addstr(0, 0, f"Search Results for '{search_query}':")
+                    if files:
+                        display_files(stdscr, files, current_index, max_height - 2, current_directory)
+                    elif search_job.done:
+                        stdscr.addstr(1, 0, "No results found.", curses.A_BOLD)
+
+                    stdscr.refresh()
+                    search_key = stdscr.getch()
 
-                        if files:
-                            display_files(stdscr, files, current_index, max_height - 2, current_directory)
+                    if search_key == -1:
+                        continue
+                    elif search_key == 27:
+                        if not search_job.done:
+                            search_job.cancel()
+                            continue
+                        current_index = previous_index
+                        break
+                    elif search_key == curses.KEY_DOWN:
+                        current_index = ((current_index + 1) % len(files) if files else 0)
+                    elif search_key == curses.KEY_UP:
+                        current_index = ((current_index - 1) % len(files) if files else 0)
+                    elif search_key == ord("\n") and in_contents and files:
+                        # Opens the preview at the match and comes back here.
+                        path, line_number, _ = search_results[current_index]
+                        stdscr.timeout(-1)
+                        try:
+                            show_preview(
+                                stdscr,
+                                path,
+                                os.path.relpath(path, start=current_directory),
+                                max_height,
+                                max_width,
+                                line_number,
+                            )
+                        except Exception as e:
+                            log_error(e)
+                        stdscr.timeout(SEARCH_REFRESH_MS)
+                    elif (search_key == curses.KEY_RIGHT or search_key == ord("\n")) and files:
+                        if in_contents:
+                            selected_path = search_results[current_index][0]
                         else:
-                            stdscr.addstr(1, 0, "No results found.", curses.A_BOLD)
-
-                        stdscr.refresh()
-                        search_key = stdscr.getch()
-
-                        if search_key == 27:
-                            break
-                        elif search_key == curses.KEY_DOWN:
-                            current_index = ((current_index + 1) % len(files) if files else 0)
-                        elif search_key == curses.KEY_UP:
-                            current_index = ((current_index - 1) % len(files) if files else 0)
-                        elif search_key == curses.KEY_RIGHT or search_key == ord("\n"):
                             selected_path = os.path.join(current_directory, files[current_index])
-                            if os.path.isdir(selected_path):
-                                current_directory = selected_path
-                            else:
-                                current_directory = os.path.dirname(selected_path)
-                                current_index = list_files(current_directory)[0].index(
-                                    os.path.basename(selected_path)
-                                )
-                            break
+                        if os.path.isdir(selected_path):
+                            current_directory = selected_path
+                        else:
+                            current_directory = os.path.dirname(selected_path)
+                            siblings = list_files(current_directory)[0]
+                            name = os.path.basename(selected_path)
+                            current_index = siblings.index(name) if name in siblings else 0
+                        break
+
+                search_job.cancel()
+                stdscr.timeout(-1)
+                if search_job.error:
+                    log_error(search_job.error)
+            renderer.invalidate()
+        elif key == ord("D"):
+            import dupes
+            import fileops
+
+            show_error = False
+            duplicate_job = dupes.DuplicateJob(current_directory, ignore=DUPLICATE_IGNORE).start()
+            groups = None
+            # Files deleted from the view, and files marked for the next delete.
+            removed = set()
+            marked = set()
+            # (job, paths) of deletes still running; their files leave the
+            # view only once the job is done, and stay if it fails.
+            removing = []
+            files = dupes.GroupRows()
+            previous_index = current_index
+            current_index = 0
+            duplicate_offset = 0
+            duplicate_message = ""
+            stdscr.timeout(SEARCH_REFRESH_MS)
+
+            while True:
+                if duplicate_job.done and groups is None:
+                    groups = duplicate_job.groups
+                    files = duplicate_rows(groups, current_directory)
+                    # The first row is a heading.
+                    current_index = 1 if files else 0
+                    if duplicate_job.error:
+                        log_error(duplicate_job.error)
+
+                finished_removals = [
+                    (job, paths) for job, paths in removing if job is None or job.state in fileops.FINISHED_STATES
+                ]
+                for job, paths in finished_removals:
+                    removing.remove((job, paths))
+                    if job is None or job.state == "done":
+                        removed.update(paths)
+                    elif job.state == "failed":
+                        duplicate_message = describe_job_error(job)
+                if finished_removals:
+                    files = duplicate_rows(groups, current_directory, removed)
+                    # A group down to one file leaves the view, marks and all.
+                    marked.intersection_update(files.paths)
+                    current_index = min(current_index, max(len(files) - 1, 0))
+                    if files and files.paths[current_index] is None:
+                        current_index += 1
+                stdscr.timeout(SEARCH_REFRESH_MS if not duplicate_job.done or removing else -1)
+
+                if not duplicate_job.done:
+                    if duplicate_job.stage == "scanning":
+                        status = f"scanning, {duplicate_job.files_seen:,} files so far..."
+                    elif duplicate_job.stage == "comparing":
+                        status = f"comparing {duplicate_job.checked:,} of {duplicate_job.to_check:,} files..."
+                    else:
+                        status = (
+                            f"hashing {format_size(duplicate_job.bytes_hashed)}"
+                            f" of {format_size(duplicate_job.bytes_to_hash)}..."
+                        )
+                    status += " (ESC to stop)"
+                elif duplicate_job.error:
+                    status = "Error: Unable to finish. Check logs for details."
+                elif duplicate_job.cancelled:
+                    status = "stopped"
+                else:
+                    status = f"{files.paths.count(None)} groups, {format_size(files.wasted_bytes)} wasted"
+
+                stdscr.erase()
+                stdscr.addstr(0, 0, f"Duplicates in {current_directory}: {status}"[: max_width - 1])
+                if files:
+                    marked_rows = {files[index] for index, path in enumerate(files.paths) if path in marked}
+                    duplicate_offset = display_files(
+                        stdscr, files, current_index, max_height - 2, current_directory, duplicate_offset, marked_rows
+                    )
+                elif duplicate_job.done and not duplicate_job.cancelled and not duplicate_job.error:
+                    stdscr.addstr(1, 0, "No duplicates found.", curses.A_BOLD)
+                if files:
+                    duplicate_message = duplicate_message or (
+                        f"{len(marked)} marked: [s] Mark, [a] All but one/none, [DEL] Delete, [SPACE] Preview, [ESC] Back"
+                    )
+                stdscr.addstr(max_height - 1, 0, duplicate_message[: max_width - 1], curses.color_pair(1))
+                stdscr.refresh()
+                duplicate_key = stdscr.getch()
+                duplicate_message = ""
+
+                if duplicate_key == -1:
+                    continue
+                elif duplicate_key == 27:
+                    if not duplicate_job.done:
+                        duplicate_job.cancel()
+                        continue
+                    current_index = previous_index
+                    break
+                elif not files:
+                    continue
+                elif duplicate_key in [curses.KEY_DOWN, curses.KEY_UP]:
+                    # Headings are skipped; each has files right below it.
+                    step = 1 if duplicate_key == curses.KEY_DOWN else -1
+                    current_index = (current_index + step) % len(files)
+                    if files.paths[current_index] is None:
+                        current_index = (current_index + step) % len(files)
+                elif duplicate_key == ord("s"):
+                    marked.symmetric_difference_update([files.paths[current_index]])
+                elif duplicate_key == ord("a"):
+                    # Marks every copy but the first of each group, or clears
+                    # the marks, like [a] in the file list.
+                    if marked:
+                        marked.clear()
+                    else:
+                        marked.update(
+                            path
+                            for index, path in enumerate(files.paths)
+                            if path is not None and files.paths[index - 1] is not None
+                        )
+                elif duplicate_key in [curses.KEY_DC, curses.KEY_SDC]:
+                    to_trash = DELETE_TO_TRASH and duplicate_key == curses.KEY_DC
+                    targets = sorted(marked) or [files.paths[current_index]]
+                    what = f"{len(targets)} marked files" if len(targets) > 1 else "this file"
+                    prompt = f"Move {what} to trash?" if to_trash else f"Permanently delete {what}?"
+                    # Warns when a group would lose every copy, not just the extra ones.
+                    chosen = set(targets)
+                    gone = removed | chosen
+                    for _, paths in removing:
+                        gone.update(paths)
+                    if any(gone.issuperset(paths) and not chosen.isdisjoint(paths) for _, paths in groups):
+                        prompt = f"No copy of some files would be left. {prompt}"
+                    stdscr.move(max_height - 1, 0)
+                    stdscr.clrtoeol()
+                    stdscr.addstr(max_height - 1, 0, f"{prompt} [y] Yes, [n] No: "[: max_width - 1], curses.A_BOLD)
+                    stdscr.refresh()
+
+                    user_input = stdscr.getch()
+                    while user_input not in [ord("y"), ord("n")]:
+                        user_input = stdscr.getch()
+
+                    if user_input == ord("y"):
+                        failure, job = remove_paths(targets, to_trash)
+                        if failure:
+                            duplicate_message = failure
+                        else:
+                            removing.append((job, targets))
+                            marked.difference_update(targets)
+                elif duplicate_key == ord(" "):
+                    selected_path = files.paths[current_index]
+                    try:
+                        show_preview(
+                            stdscr,
+                            selected_path,
+                            os.path.relpath(selected_path, start=current_directory),
+                            max_height,
+                            max_width,
+                        )
+                    except Exception as e:
+                        log_error(e)
+                        duplicate_message = "Error reading file. Check logs for details."
+                elif duplicate_key in [curses.KEY_RIGHT, ord("\n")]:
+                    selected_path = files.paths[current_index]
+                    current_directory = os.path.dirname(selected_path)
+                    siblings = list_files(current_directory)[0]
+                    name = os.path.basename(selected_path)
+                    current_index = siblings.index(name) if name in siblings else 0
+                    break
+
+            duplicate_job.cancel()
+            stdscr.timeout(-1)
+            renderer.invalidate()
+        elif key == ord("u"):
+            import usage
+
+            show_error = False
+            usage_scan = usage.UsageScan(current_directory).start()
+            # The folder shown, relative to where the view was opened, and
+            # the cursor position in each folder above it.
+            usage_path = ""
+            usage_trail = []
+            usage_shown = None
+            files = usage.UsageRows([], [])
+            previous_index = current_index
+            current_index = 0
+            usage_offset = 0
+
+            while True:
+                tree = usage_scan.tree
+                if tree is not None and (usage_shown is None or usage_shown[0] != usage_path or usage_shown[1] is not tree.totals):
+                    # Rebuilt when moving to another folder or when a rescan
+                    # finishes; after a rescan the cursor stays on its name.
+                    rescanned = usage_shown is not None and usage_shown[0] == usage_path
+                    selected_name = files.children[current_index][0] if files and rescanned else None
+                    usage_shown = (usage_path, tree.totals)
+                    total = tree.totals.get(usage_path, (0, 0, 0))
+                    children = tree.children(usage_path)
+                    files = usage_rows(children, total[0], max_width - 3)
+                    names = [name for name, _, _ in children]
+                    if selected_name in names:
+                        current_index = names.index(selected_name)
+                current_index = min(current_index, max(len(files) - 1, 0))
+
+                shown_path = os.path.join(usage_scan.root, usage_path) if usage_path else usage_scan.root
+                if tree is not None:
+                    total_bytes, file_count, dir_count = tree.totals.get(usage_path, (0, 0, 0))
+                    title = f"{shown_path}: {format_size(total_bytes)} in {file_count:,} file(s), {dir_count:,} folder(s)"
+                else:
+                    title = shown_path
+                if usage_scan.error:
+                    status = "Error: Unable to scan the folder. Check logs for details."
+                elif tree is None:
+                    status = f"Scanning, {usage_scan.scanned:,} folders so far... (ESC to leave)"
+                elif not usage_scan.done:
+                    status = f"Looking for changes, {usage_scan.scanned:,} folders so far... (ESC to leave)"
+                else:
+                    status = "[→] Open folder, [←] Up, [ENTER] Go to, [ESC] Leave"
+
+                stdscr.erase()
+                stdscr.addstr(0, 0, f"Disk usage: {title}"[: max_width - 1], curses.color_pair(1) | curses.A_BOLD)
+                if files:
+                    usage_offset = display_files(
+                        stdscr, files, current_index, max_height - 2, current_directory, usage_offset
+                    )
+                elif tree is not None:
+                    stdscr.addstr(1, 0, "This directory is empty.", curses.color_pair(4))
+                stdscr.addstr(max_height - 1, 0, status[: max_width - 1], curses.color_pair(1))
+                stdscr.refresh()
+
+                stdscr.timeout(-1 if usage_scan.done else SEARCH_REFRESH_MS)
+                usage_key = stdscr.getch()
+
+                if usage_key == -1:
+                    continue
+                elif usage_key == 27:
+                    current_index = previous_index
+                    break
+                elif usage_key == curses.KEY_DOWN:
+                    current_index = (current_index + 1) % len(files) if files else 0
+                elif usage_key == curses.KEY_UP:
+                    current_index = (current_index - 1) % len(files) if files else 0
+                elif usage_key == curses.KEY_RIGHT and files and files.is_dir_at(current_index):
+                    # Sizes below come from the same tree; nothing is rescanned.
+                    usage_trail.append(current_index)
+                    usage_path = os.path.join(usage_path, files.children[current_index][0])
+                    current_index = 0
+                    usage_offset = 0
+                elif usage_key == curses.KEY_LEFT:
+                    if not usage_path:
+                        current_index = previous_index
+                        break
+                    usage_path = os.path.dirname(usage_path)
+                    current_index = usage_trail.pop() if usage_trail else 0
+                    usage_offset = 0
+                elif usage_key == ord("\n"):
+                    current_directory = shown_path
+                    if files:
+                        siblings = list_files(current_directory)[0]
+                        name = files.children[current_index][0]
+                        current_index = siblings.index(name) if name in siblings else 0
+                    else:
+                        current_index = 0
+                    break
+
+            usage_scan.cancel()
+            stdscr.timeout(-1)
+            if usage_scan.error:
+                log_error(usage_scan.error)
+            renderer.invalidate()
+        elif key == ord("/"):
+            import fuzzy
+
+            show_error = False
+            finder = fuzzy.FuzzyFinder(current_directory).start()
+            matcher = None
+            query = ""
+            files = []
+            previous_index = current_index
+            current_index = 0
+            indicator = "_"
+
+            while True:
+                if finder.matcher is not matcher:
+                    matcher = finder.matcher
+                    matcher.set_query(query)
+                ranking = matcher is not None and not matcher.work(FUZZY_WORK_MS / 1000)
+                if matcher is not None:
+                    files = matcher.results()
+                current_index = min(current_index, max(len(files) - 1, 0))
+
+                if matcher is None:
+                    status = f"indexing, {finder.indexed:,} entries so far..."
+                else:
+                    matched, scanned, total = matcher.progress()
+                    status = f"{matched:,} of {len(matcher.paths):,}"
+                    if ranking:
+                        status += f", ranking {scanned * 100 // max(total, 1)}%..."
+                    elif not finder.done:
+                        status += ", refreshing..."
+
+                stdscr.erase()
+                stdscr.addstr(0, 0, f"Find: {query}"[: max_width - 1], curses.color_pair(4) | curses.A_BOLD)
+                stdscr.addstr(max_height - 1, 0, f"{status} (ESC to leave)"[: max_width - 1], curses.color_pair(1))
+                if files:
+                    display_files(stdscr, files, current_index, max_height - 2, current_directory)
+                elif matcher is not None and not ranking:
+                    stdscr.addstr(1, 0, "No matches.", curses.A_BOLD)
+                stdscr.refresh()
+
+                # Keys are read between batches while ranking; otherwise the
+                # loop only wakes up to see whether the index has caught up.
+                stdscr.timeout(0 if ranking else -1 if finder.done else SEARCH_REFRESH_MS)
+                find_key = stdscr.getch()
+
+                if find_key == -1:
+                    continue
+                elif find_key == 27:
+                    current_index = previous_index
+                    break
+                elif find_key in [curses.KEY_BACKSPACE, 127, 8]:
+                    query = query[:-1]
+                    current_index = 0
+                elif 32 <= find_key <= 126:
+                    query += chr(find_key)
+                    current_index = 0
+                elif find_key == curses.KEY_DOWN:
+                    current_index = (current_index + 1) % len(files) if files else 0
+                elif find_key == curses.KEY_UP:
+                    current_index = (current_index - 1) % len(files) if files else 0
+                elif (find_key == curses.KEY_RIGHT or find_key == ord("\n")) and files:
+                    selected_path = os.path.join(current_directory, files[current_index])
+                    if os.path.isdir(selected_path):
+                        current_directory = selected_path
+                        current_index = 0
+                    else:
+                        current_directory = os.path.dirname(selected_path)
+                        siblings = list_files(current_directory)[0]
+                        name = os.path.basename(selected_path)
+                        current_index = siblings.index(name) if name in siblings else 0
+                    break
+                if matcher is not None:
+                    matcher.set_query(query)
+
+            finder.cancel()
+            stdscr.timeout(-1)
+            if finder.error:
+                log_error(finder.error)
+            renderer.invalidate()
         elif key == ord(" "):
             selected_item = files[current_index]
             selected_path = os.path.join(current_directory, selected_item)
 
             if os.path.isfile(selected_path):
                 try:
-                    with open(selected_path, "r", encoding="utf-8") as f:
-                        file_content = f.readlines()
-
-                    preview_index = 0
-                    scroll_x = 0
-
-                    while True:
-                        stdscr.clear()
-                        stdscr.addstr(0, 0, f"Preview: {selected_item} (SPACE to exit, ←/→ & ↑/↓ to scroll)", curses.color_pair(1) | curses.A_BOLD)
-
-                        max_preview_height = max_height - 2
-                        for i in range(max_preview_height):
-                            if preview_index + i < len(file_content):
-                                line = file_content[preview_index + i]
-                                stdscr.addstr(i + 1, 0, line[scroll_x : scroll_x + max_width - 1])
-
-                        stdscr.refresh()
-                        preview_key = stdscr.getch()
-
-                        if preview_key == ord(" ") or preview_key == 27:
-                            break
-                        elif (
-                            preview_key == curses.KEY_DOWN
-                            and preview_index + max_preview_height < len(file_content)
-                        ):
-                            preview_index += 1
-                        elif preview_key == curses.KEY_UP and preview_index > 0:
-                            preview_index -= 1
-                        elif preview_key == curses.KEY_RIGHT:
-                            scroll_x += 5
-                        elif preview_key == curses.KEY_LEFT and scroll_x > 0:
-                            scroll_x -= 5
+                    show_preview(stdscr, selected_path, selected_item, max_height, max_width)
                 except Exception as e:
                     error_message = f"Error reading file: {str(e)}"
                     show_error = True
+                renderer.invalidate()
+
+    directory_watcher.close()
+    tab_refresher.close()
+    prefetcher.close()
+    if trash_purger is not None:
+        trash_purger.close()
+    frame_profiler.close()
+
+    for entry in undo_stack + redo_stack:
+        if entry.get("backup"):
+            import fileops
+
+            try:
+                fileops.discard_backup(entry["backup"])
+            except OSError as e:
+                log_error(e)
 
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        # In a PyInstaller build the search worker processes start this same
+        # executable; freeze_support() turns them into workers, not new apps.
+        import multiprocessing
+
+        multiprocessing.freeze_support()
     try:
-        directories = sys.argv[1].split("*") if len(sys.argv) > 1 else [os.getcwd()]
+        arguments = sys.argv[1:]
+        if "--profile" in arguments:
+            arguments.remove("--profile")
+            PROFILE_FRAMES = True
+        directories = arguments[0].split("*") if arguments else [os.getcwd()]
         for directory in directories:
             validate_directory(directory)
         curses.wrapper(lambda stdscr: main(stdscr, directories))
@@ -0,0 +1,255 @@
+import bisect
+import codecs
+import mmap
+import os
+
+
+# Newline counts are recorded once per chunk as the file is scanned, so a
+# later goto only has to count forward from the nearest chunk boundary.
+INDEX_CHUNK_SIZE = 1024 * 1024
+# Upper bound on the bytes decoded for one screen row, however long the line.
+MAX_BYTES_PER_CHAR = 4
+# How much of the file is looked at to decide between text and hex preview.
+SNIFF_BYTES = 8192
+# Share of control characters above which a sample counts as binary.
+CONTROL_RATIO = 0.3
+HEX_ROW_BYTES = 16
+# Line starts whose following line is remembered while scrolling.
+LINE_END_CACHE_ENTRIES = 4096
+
+TEXT_CONTROLS = frozenset(b"\t\n\r\f\b\x1b")
+
+
+def printable(text):
+    text = text.expandtabs(8)
+    if text.isprintable():
+        return text
+    return "".join(char if char.isprintable() else "." for char in text)
+
+
+def looks_binary(sample):
+    if b"\0" in sample:
+        return True
+    try:
+        # The sample may end partway through a multi-byte character.
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    controls = sum(1 for byte in sample if byte < 32 and byte not in TEXT_CONTROLS)
+    return controls > len(sample) * CONTROL_RATIO
+
+
+def open_preview(path):
+    with open(path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+    return HexPreview(path) if looks_binary(sample) else TextPreview(path)
+
+
+class TextPreview:
+    goto_prompt = "Go to line: "
+
+    # Views a file through a read-only mmap. The viewport is tracked as the
+    # byte offset of its first line, so scrolling, paging and jumping to the
+    # end only ever touch the bytes around the screen. Line numbers are
+    # known while scrolling from a known line; after jumping to the end they
+    # are worked out only if asked for.
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.top = 0
+        self.top_line = 0
+        # Chunk boundaries and the number of newlines before each one,
+        # extended lazily by line_offset().
+        self.checkpoint_offsets = [0]
+        self.checkpoint_lines = [0]
+        # Line start -> next line start (or None), filled by next_line().
+        self.line_ends = {}
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.file.close()
+
+    def next_line(self, offset):
+        # Remembered, since on a long line the search runs far past the
+        # bytes shown, and the same rows are asked for every frame.
+        if offset in self.line_ends:
+            return self.line_ends[offset]
+        end = self.data.find(b"\n", offset)
+        following = None if end == -1 or end + 1 >= self.size else end + 1
+        if len(self.line_ends) >= LINE_END_CACHE_ENTRIES:
+            self.line_ends.clear()
+        self.line_ends[offset] = following
+        return following
+
+    def previous_line(self, offset):
+        if offset == 0:
+            return None
+        return self.data.rfind(b"\n", 0, offset - 1) + 1
+
+    def line_at(self, offset, scroll_x, width):
+        # Only the bytes that can reach the screen are searched; without a
+        # newline among them the row is cut off there.
+        limit = min(self.size, offset + (scroll_x + width) * MAX_BYTES_PER_CHAR)
+        end = self.data.find(b"\n", offset, limit)
+        if end != -1:
+            limit = end
+        text = self.data[offset:limit].decode("utf-8", errors="replace").rstrip("\r")
+        return printable(text)[scroll_x : scroll_x + width]
+
+    def rows(self, height, scroll_x, width):
+        rows, offset = [], self.top if self.size else None
+        while offset is not None and len(rows) < height:
+            rows.append(self.line_at(offset, scroll_x, width))
+            offset = self.next_line(offset)
+        return rows
+
+    def scroll(self, delta, height):
+        moved = 0
+        if delta > 0:
+            last_top = self.bottom_top(height)
+            while moved < delta and self.top < last_top:
+                following = self.next_line(self.top)
+                if following is None:
+                    break
+                self.top = following
+                moved += 1
+        else:
+            while moved < -delta:
+                previous = self.previous_line(self.top)
+                if previous is None:
+                    break
+                self.top = previous
+                moved += 1
+            moved = -moved
+        if self.top_line is not None:
+            self.top_line += moved
+
+    def home(self):
+        self.top, self.top_line = 0, 0
+
+    def bottom_top(self, height):
+        # Offset of the first line of the last full screen, found by walking
+        # back from the end of the file.
+        if not self.size:
+            return 0
+        end = self.size - 1 if self.data[self.size - 1 : self.size] == b"\n" else self.size
+        start = end
+        for _ in range(height):
+            start = self.data.rfind(b"\n", 0, end) + 1
+            if start == 0:
+                return 0
+            end = start - 1
+        return start
+
+    def end(self, height):
+        self.top = self.bottom_top(height)
+        self.top_line = None
+
+    def line_offset(self, line):
+        # Byte offset where `line` (0-based) starts, or None past the end.
+        # Counting resumes from the last checkpoint with fewer newlines than
+        # wanted, whole chunks at a time, then line by line in the final one.
+        index = max(0, bisect.bisect_left(self.checkpoint_lines, line) - 1)
+        offset, newlines = self.checkpoint_offsets[index], self.checkpoint_lines[index]
+
+        while newlines < line:
+            chunk_end = min(offset + INDEX_CHUNK_SIZE, self.size)
+            if chunk_end <= offset:
+                return None
+            count = self.data[offset:chunk_end].count(b"\n")
+            if newlines + count >= line:
+                break
+            newlines += count
+            offset = chunk_end
+            if offset > self.checkpoint_offsets[-1]:
+                self.checkpoint_offsets.append(offset)
+                self.checkpoint_lines.append(newlines)
+
+        while newlines < line:
+            offset = self.data.find(b"\n", offset) + 1
+            newlines += 1
+        return offset if offset < self.size else None
+
+    def parse_target(self, text):
+        # "Go to" input is a 1-based line number.
+        return int(text) - 1 if text.isdigit() and int(text) > 0 else None
+
+    def goto(self, line, height):
+        offset = self.line_offset(max(0, line))
+        if offset is None:
+            self.end(height)
+            return False
+        self.top, self.top_line = offset, line
+        return True
+
+    def position(self):
+        percent = self.top * 100 // self.size if self.size else 100
+        if self.top_line is None:
+            return f"{percent}%"
+        return f"Line {self.top_line + 1} ({percent}%)"
+
+
+class HexPreview:
+    # Hex dump of a file through a read-only mmap. Rows are fixed-width, so
+    # the viewport is just a row number and every scroll or jump costs the
+    # same however large the file is; only the bytes on screen are read.
+    goto_prompt = "Go to offset: "
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.row_count = (self.size + HEX_ROW_BYTES - 1) // HEX_ROW_BYTES
+        self.top = 0
+
+    def close(self):
+        if self.size:
+            self.data.close()
+        self.file.close()
+
+    def format_row(self, row):
+        offset = row * HEX_ROW_BYTES
+        chunk = self.data[offset : offset + HEX_ROW_BYTES]
+        hex_bytes = " ".join(f"{byte:02x}" for byte in chunk)
+        text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in chunk)
+        return f"{offset:08x}  {hex_bytes:<{HEX_ROW_BYTES * 3 - 1}}  |{text}|"
+
+    def rows(self, height, scroll_x, width):
+        last = min(self.top + height, self.row_count)
+        return [self.format_row(row)[scroll_x : scroll_x + width] for row in range(self.top, last)]
+
+    def bottom_top(self, height):
+        return max(0, self.row_count - height)
+
+    def scroll(self, delta, height):
+        self.top = max(0, min(self.top + delta, self.bottom_top(height)))
+
+    def home(self):
+        self.top = 0
+
+    def end(self, height):
+        self.top = self.bottom_top(height)
+
+    def parse_target(self, text):
+        # "Go to" input is a byte offset, decimal or 0x-prefixed hex.
+        try:
+            offset = int(text, 0)
+        except ValueError:
+            return None
+        return offset if offset >= 0 else None
+
+    def goto(self, offset, height):
+        if offset >= self.size:
+            self.end(height)
+            return False
+        self.top = min(offset // HEX_ROW_BYTES, self.bottom_top(height))
+        return True
+
+    def position(self):
+        percent = self.top * 100 // self.row_count if self.row_count else 100
+        return f"Offset 0x{self.top * HEX_ROW_BYTES:08x} ({percent}%)"
@@ -0,0 +1,104 @@
+import time
+from collections import deque
+
+
+# Percentiles on the overlay cover this many of the latest frames.
+WINDOW_FRAMES = 500
+# Trace lines are buffered and written this many frames at a time.
+FLUSH_FRAMES = 50
+
+
+class FrameProfiler:
+    # Times the phases of each pass through the main loop and counts the
+    # filesystem calls made meanwhile. `counters` returns running totals;
+    # each frame records how much they grew, background threads included.
+    # Time spent waiting for a key is traced but left out of the frame
+    # time. Without a trace path every method returns straight away.
+
+    def __init__(self, trace_path, counters):
+        self.enabled = trace_path is not None
+        self.counters = counters
+        self.frame_times = deque(maxlen=WINDOW_FRAMES)
+        self.frames = 0
+        self.last_frame = 0.0
+        self.last_calls = {}
+        self._phases = {}
+        self._start = None
+        self._mark = None
+        self._lines = []
+        self._trace = None
+        if self.enabled:
+            self._totals = counters()
+            self._trace = open(trace_path, "a", encoding="utf-8")
+
+    def begin_frame(self):
+        # Whatever ran since the last mark was the key handler of the
+        # previous frame, however it left the loop.
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._start is not None:
+            self.mark("key", now)
+            self._finish(now)
+        self._start = self._mark = now
+        self._phases = {}
+
+    def mark(self, phase, now=None):
+        if not self.enabled:
+            return
+        now = now or time.perf_counter()
+        self._phases[phase] = self._phases.get(phase, 0.0) + now - self._mark
+        self._mark = now
+
+    def _finish(self, now):
+        # Only needed when profiling is on.
+        import json
+
+        frame = now - self._start - self._phases.get("wait", 0.0)
+        totals = self.counters()
+        self.last_calls = {name: count - self._totals.get(name, 0) for name, count in totals.items()}
+        self._totals = totals
+        self.last_frame = frame
+        self.frame_times.append(frame)
+        self.frames += 1
+
+        self._lines.append(
+            json.dumps(
+                {
+                    "frame": self.frames,
+                    "time": round(time.time(), 3),
+                    "frame_ms": round(frame * 1000, 3),
+                    "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self._phases.items()},
+                    "calls": self.last_calls,
+                }
+            )
+        )
+        if len(self._lines) >= FLUSH_FRAMES:
+            self.flush()
+
+    def percentile(self, fraction):
+        if not self.frame_times:
+            return 0.0
+        frame_times = sorted(self.frame_times)
+        return frame_times[min(len(frame_times) - 1, int(fraction * len(frame_times)))]
+
+    def overlay(self):
+        calls = " ".join(f"{name} {count}" for name, count in self.last_calls.items() if count)
+        return (
+            f"{self.last_frame * 1000:.1f}ms p95 {self.percentile(0.95) * 1000:.1f} "
+            f"p99 {self.percentile(0.99) * 1000:.1f}" + (f" | {calls}" if calls else "")
+        )
+
+    def flush(self):
+        if self._trace is None or not self._lines:
+            return
+        self._trace.write("\n".join(self._lines) + "\n")
+        self._trace.flush()
+        self._lines = []
+
+    def close(self):
+        if self._trace is None:
+            return
+        self.flush()
+        self._trace.close()
+        self._trace = None
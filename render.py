@@ -0,0 +1,53 @@
+import curses
+
+
+# Marks a row that was drawn outside the renderer (prompts, echoed input), so
+# it never compares equal to the next frame's contents.
+STALE = object()
+
+
+class Renderer:
+    # Collects a frame through an addstr()-compatible interface, then writes
+    # only the rows whose contents differ from what is already on screen.
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.screen_rows = {}
+        self.pending_rows = {}
+        self.screen_size = None
+        self.row_updates = 0
+
+    def begin(self):
+        self.pending_rows = {}
+        size = self.stdscr.getmaxyx()
+        if size != self.screen_size:
+            self.screen_size = size
+            self.invalidate()
+
+    def addstr(self, y, x, text, attr=0):
+        self.pending_rows.setdefault(y, []).append((x, text, attr))
+
+    def invalidate(self):
+        self.stdscr.erase()
+        self.screen_rows = {}
+
+    def forget_row(self, y):
+        self.screen_rows[y] = STALE
+
+    def flush(self):
+        updates = 0
+        for y in set(self.screen_rows) | set(self.pending_rows):
+            segments = self.pending_rows.get(y)
+            if self.screen_rows.get(y) == segments:
+                continue
+            self.stdscr.move(y, 0)
+            self.stdscr.clrtoeol()
+            for x, text, attr in segments or ():
+                self.stdscr.addstr(y, x, text, attr)
+            updates += 1
+
+        self.screen_rows = self.pending_rows
+        self.row_updates = updates
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+        return updates
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import fileindex
+
+
+# Directories smaller than this are matched on the walker thread that read
+# them; shipping a handful of names to another process costs more than it saves.
+PROCESS_BATCH_MIN = 2048
+
+
+def filter_names(parts, names):
+    return [name for name in names if all(part in name.lower() for part in parts)]
+
+
+class SearchJob:
+    # Runs a filename search on a background thread. The UI polls `results`,
+    # which only ever grows or is swapped for a complete new list, so it can
+    # be read at any time without locking.
+
+    def __init__(self, root, query, limit, processes=0):
+        self.root = os.path.abspath(root)
+        self.query = query
+        self.parts = query.lower().split()
+        self.limit = limit
+        self.results = []
+        self.truncated = False
+        self.done = False
+        self.error = None
+        self.processes = processes
+        self._pool = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _add(self, paths):
+        with self._lock:
+            room = self.limit - len(self.results)
+            if len(paths) > room:
+                paths = paths[:room]
+                self.truncated = True
+            if paths:
+                self.results.extend(paths)
+
+    def _visit(self, relpath, names):
+        if self.cancelled:
+            return
+        if len(self.results) >= self.limit:
+            self.truncated = True
+            return
+        if self._pool is not None and len(names) >= PROCESS_BATCH_MIN:
+            matched = self._pool.submit(filter_names, self.parts, names).result()
+        else:
+            matched = filter_names(self.parts, names)
+        directory = os.path.join(self.root, relpath)
+        self._add([os.path.join(directory, name) for name in matched])
+
+    def _run(self):
+        index = fileindex.get_index(self.root)
+        try:
+            with index.lock:
+                # A warm index answers straight away from its last known
+                # state; the refresh below then corrects it if the tree moved.
+                # A cold index streams matches while it is being built.
+                warm = bool(index.dirs)
+                if warm:
+                    self._add(index.search(self.query))
+
+                if not warm and self.processes:
+                    self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+                changed = index.update(None if warm else self._visit, self._cancelled)
+
+                if warm and changed and not self.cancelled:
+                    matches = index.search(self.query)
+                    self.truncated = len(matches) > self.limit
+                    self.results = matches[: self.limit]
+                if changed:
+                    index.save()
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self.done = True
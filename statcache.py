@@ -0,0 +1,105 @@
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+
+STAT_CACHE_ENTRIES = 100_000
+# Even in a watched directory a file's stat is renewed after this long:
+# writes through a shared mmap change its size and mtime without an event.
+WATCHED_STAT_MAX_AGE_NS = 5_000_000_000
+
+
+class StatCache:
+    # path -> os.stat() result, shared by everything that draws a screen.
+    # Results are reused until the next refresh(), so a path is stat'ed at
+    # most once per redraw however many places ask about it. Files in a
+    # directory a watcher covers are reused across refreshes until that
+    # directory is invalidated, or for WATCHED_STAT_MAX_AGE_NS at most.
+    # Folders are not: a change inside one updates its mtime without an
+    # event in the parent. Watched directories never include those on
+    # network or FUSE filesystems, whose files change without events.
+
+    def __init__(self, max_entries=STAT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._stats = OrderedDict()
+        self._by_directory = {}
+        self._lock = threading.Lock()
+        self._refresh = 0
+        self.watched = {}
+        self.calls = 0
+        self.saved = 0
+
+    def refresh(self):
+        self._refresh += 1
+
+    def set_watched(self, watched):
+        # Takes the ListingCache's directory -> watch start mapping, which
+        # holds only the directories the watcher reports as live.
+        self.watched = watched
+
+    def _usable(self, path, cached):
+        info, refresh, checked_ns = cached
+        if refresh == self._refresh:
+            return True
+        if stat.S_ISDIR(info.st_mode):
+            return False
+        since = self.watched.get(os.path.dirname(path))
+        return since is not None and checked_ns >= since and time.time_ns() - checked_ns < WATCHED_STAT_MAX_AGE_NS
+
+    def stat(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            cached = self._stats.get(path)
+            if cached is not None and self._usable(path, cached):
+                self._stats.move_to_end(path)
+                self.saved += 1
+                return cached[0]
+
+        info = os.stat(path)
+        with self._lock:
+            self.calls += 1
+            if path not in self._stats:
+                self._by_directory.setdefault(os.path.dirname(path), set()).add(path)
+            self._stats[path] = (info, self._refresh, time.time_ns())
+            self._stats.move_to_end(path)
+            while len(self._stats) > self.max_entries:
+                evicted, _ = self._stats.popitem(last=False)
+                self._forget(evicted)
+        return info
+
+    def is_dir(self, path, known=None):
+        # `known` is the answer scandir already gave for the entry, if any;
+        # it is used as-is and only counted.
+        if known is not None:
+            with self._lock:
+                self.saved += 1
+            return known
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except OSError:
+            return False
+
+    def _forget(self, path):
+        siblings = self._by_directory.get(os.path.dirname(path))
+        if siblings is not None:
+            siblings.discard(path)
+            if not siblings:
+                del self._by_directory[os.path.dirname(path)]
+
+    def invalidate(self, directory=None):
+        # Drops a directory's own entry and those of everything in it.
+        with self._lock:
+            if directory is None:
+                self._stats.clear()
+                self._by_directory.clear()
+                return
+            directory = os.path.abspath(directory)
+            for path in self._by_directory.pop(directory, set()):
+                self._stats.pop(path, None)
+            if self._stats.pop(directory, None) is not None:
+                self._forget(directory)
+
+    def counters(self):
+        return {"stat_calls": self.calls, "stats_saved": self.saved, "cached": len(self._stats)}
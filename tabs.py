@@ -0,0 +1,68 @@
+import os
+import threading
+
+
+# How often the listings of tabs in the background are re-validated when no
+# change has been reported for them.
+TAB_REFRESH_SECONDS = 2.0
+
+
+class Tab:
+    # Everything needed to put a tab back on screen exactly as it was left.
+    __slots__ = ("directory", "current_index", "scroll_offset", "history", "history_index")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.current_index = 0
+        self.scroll_offset = 0
+        self.history = [directory]
+        self.history_index = 0
+
+    def save(self, directory, current_index, scroll_offset, history, history_index):
+        self.directory = directory
+        self.current_index = current_index
+        self.scroll_offset = scroll_offset
+        self.history = history
+        self.history_index = history_index
+
+    def restore(self):
+        return self.directory, self.current_index, self.scroll_offset, self.history, self.history_index
+
+
+class TabRefresher:
+    # Keeps the listings of background tabs in the listing cache, reading
+    # them on its own thread, so switching to a tab finds its listing ready.
+
+    def __init__(self, listing_cache, interval=TAB_REFRESH_SECONDS):
+        self.listing_cache = listing_cache
+        self.interval = interval
+        self._directories = []
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def track(self, directories):
+        directories = list(dict.fromkeys(os.path.abspath(directory) for directory in directories))
+        if directories != self._directories:
+            self._directories = directories
+            self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            for directory in self._directories:
+                if self._stopped.is_set():
+                    return
+                try:
+                    self.listing_cache.get(directory)
+                except OSError:
+                    continue
+            self._wake.wait(self.interval)
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
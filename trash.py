@@ -0,0 +1,214 @@
+import errno
+import os
+import tempfile
+import threading
+import time
+
+import fileindex
+import fileops
+
+
+# How often the trash is checked for items to purge, besides after each delete.
+PURGE_INTERVAL_SECONDS = 15 * 60
+# Items trashed more recently than this are left alone, so an undo right
+# after a delete always finds them.
+PURGE_GRACE_SECONDS = 10 * 60
+ORIGIN_FILE = ".origin"
+
+
+def process_alive(pid):
+    if os.name == "nt":
+        # os.kill() would end the process there; such backups go by age.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def discard_holder(holder):
+    try:
+        os.remove(os.path.join(holder, ORIGIN_FILE))
+    except OSError:
+        pass
+    try:
+        os.rmdir(holder)
+    except OSError:
+        pass
+
+
+def trash_path(path):
+    # Moves path into the trash on its own filesystem and returns where it
+    # went. Each item gets a holder directory of its own, so names never
+    # clash, and the holder records where the item came from. Returns
+    # (trashed_path, False) if the trash is on another filesystem; the
+    # caller then moves it with a background job.
+    trash_bin = fileops.storage_dir(path, "trash")
+    holder = tempfile.mkdtemp(prefix="trash-", dir=trash_bin)
+    trashed = os.path.join(holder, os.path.basename(path.rstrip(os.sep)) or "root")
+    try:
+        with open(os.path.join(holder, ORIGIN_FILE), "w", encoding="utf-8") as f:
+            f.write(os.path.abspath(path))
+    except OSError:
+        pass
+
+    try:
+        os.rename(path, trashed)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return trashed, False
+        discard_holder(holder)
+        raise
+    return trashed, True
+
+
+def restore_path(trashed, original):
+    # Puts a trashed item back. Returns False if it has to cross filesystems,
+    # in which case the caller moves it with a background job.
+    if os.path.lexists(original):
+        raise FileExistsError(errno.EEXIST, "An item with the original name already exists", original)
+    if not fileops.rename_path(trashed, original):
+        return False
+    discard_holder(os.path.dirname(trashed))
+    return True
+
+
+def trash_paths(paths):
+    # Trashes several items as one unit. Returns the [original, trashed]
+    # pairs and the subset that still has to be moved across filesystems.
+    # If one fails, the ones already trashed are put back.
+    items, pending = [], []
+    try:
+        for path in paths:
+            trashed, renamed = trash_path(path)
+            items.append([path, trashed])
+            if not renamed:
+                pending.append((path, trashed))
+    except OSError:
+        for path, trashed in items:
+            if (path, trashed) not in pending:
+                restore_path(trashed, path)
+        raise
+    return items, pending
+
+
+def restore_paths(items):
+    # Puts back the items of trash_paths(); nothing is moved unless every
+    # original name is free. Returns the pairs that have to be moved across
+    # filesystems.
+    for original, _ in items:
+        if os.path.lexists(original):
+            raise FileExistsError(errno.EEXIST, "An item with the original name already exists", original)
+    return [(trashed, original) for original, trashed in items if not restore_path(trashed, original)]
+
+
+class TrashPurger:
+    # Frees trash space on a background thread at the lowest CPU priority:
+    # items older than max_age_days go first, then the oldest items until
+    # what is left fits in max_bytes. Sizes are measured once per item. The
+    # newest item is never purged for size, even if it alone is over
+    # max_bytes. `in_use` returns the paths of running jobs; holders they
+    # read from or write into are skipped. Overwrite backups left by a
+    # session that ended without cleaning up (a crash, Ctrl-C) go too.
+
+    def __init__(self, max_bytes, max_age_days, in_use=None):
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.in_use = in_use or (lambda: [])
+        self.error = None
+        self._sizes = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _holders(self):
+        holders = []
+        for trash_bin in fileops.known_storage("trash"):
+            try:
+                with os.scandir(trash_bin) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("trash-") and entry.is_dir(follow_symlinks=False):
+                            holders.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+            except OSError:
+                continue
+        holders.sort()
+        return holders
+
+    def _size(self, holder):
+        if holder not in self._sizes:
+            job = fileops.Job("delete", holder)
+            self._sizes[holder] = fileops.measure(holder, job, follow_symlinks=False)[1]
+        return self._sizes[holder]
+
+    def _remove(self, holder):
+        fileops.delete_path(holder)
+        self._sizes.pop(holder, None)
+
+    def _purge_backups(self, oldest_kept):
+        for directory in fileops.known_storage("backups"):
+            try:
+                with os.scandir(directory) as entries:
+                    holders = [
+                        (entry.path, entry.stat(follow_symlinks=False).st_mtime)
+                        for entry in entries
+                        if entry.name.startswith("backup-") and entry.is_dir(follow_symlinks=False)
+                    ]
+            except OSError:
+                continue
+            for holder, modified in holders:
+                if self._stopped.is_set():
+                    return
+                owner = fileops.backup_owner(holder)
+                if owner == os.getpid():
+                    continue
+                if owner is None or not process_alive(owner) or modified < oldest_kept:
+                    fileops.delete_path(holder)
+
+    def purge(self):
+        now = time.time()
+        oldest_kept = now - self.max_age_days * 24 * 60 * 60
+        self._purge_backups(oldest_kept)
+        holders = self._holders()
+        busy = {os.path.dirname(path) for path in self.in_use()}
+        kept = []
+        for modified, holder in holders:
+            if self._stopped.is_set():
+                return
+            if holder in busy or modified > now - PURGE_GRACE_SECONDS:
+                continue
+            if modified < oldest_kept:
+                self._remove(holder)
+            else:
+                kept.append(holder)
+
+        total = sum(self._size(holder) for holder in kept)
+        for holder in kept[:-1]:
+            if total <= self.max_bytes or self._stopped.is_set():
+                break
+            total -= self._size(holder)
+            self._remove(holder)
+
+    def _run(self):
+        try:
+            # Linux applies this to the calling thread only.
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while not self._stopped.is_set():
+            try:
+                self.purge()
+            except OSError as e:
+                self.error = e
+            self._wake.wait(PURGE_INTERVAL_SECONDS)
+            self._wake.clear()
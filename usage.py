@@ -0,0 +1,241 @@
+import hashlib
+import os
+import pickle
+import stat
+import threading
+import time
+from collections import defaultdict
+
+import walker
+from fileindex import cache_dir
+from listing import RACY_WINDOW_NS
+
+
+USAGE_VERSION = 1
+
+# Only the tree of the last root opened is kept in memory; others are
+# loaded back from their saved file when opened again.
+_tree = None
+_tree_lock = threading.Lock()
+
+
+def scan_directory(path, device, mtime_ns):
+    # Folders on another filesystem are left out, like `du -x` does.
+    # DirEntry.stat() reports no device on Windows, which never mounts
+    # one folder inside another anyway. Files with several hard links are
+    # returned apart, so that they can be counted once.
+    own_bytes, own_files, subdirs, links = 0, 0, [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                info = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISDIR(info.st_mode):
+                if not info.st_dev or info.st_dev == device:
+                    subdirs.append(entry.name)
+            else:
+                own_files += 1
+                if info.st_nlink > 1 and info.st_ino:
+                    links.append((info.st_dev, info.st_ino, info.st_size))
+                else:
+                    own_bytes += info.st_size
+    return mtime_ns, time.time_ns(), own_bytes, own_files, tuple(sorted(subdirs)), tuple(links)
+
+
+class UsageTree:
+    # Every directory under root is stored as
+    #   relpath -> (mtime_ns, listed_ns, own_bytes, own_files, subdirs, links)
+    # where own_* only count what is not a folder. Like the search index, an
+    # update stats every directory and lists again only the ones whose mtime
+    # moved. `totals` then holds (bytes, files, folders) for each whole
+    # subtree, summed bottom-up, so moving around the tree never rescans.
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.dirs = {}
+        self.totals = {}
+        # (device, inode) -> the folder a file with several hard links is
+        # counted in.
+        self.link_owners = {}
+        self.lock = threading.Lock()
+        self.file_path = os.path.join(
+            cache_dir("usage"),
+            hashlib.sha1(self.root.encode("utf-8", "surrogateescape")).hexdigest() + ".usage",
+        )
+
+    def load(self):
+        try:
+            with open(self.file_path, "rb") as f:
+                version, root, dirs = pickle.load(f)
+        except Exception:
+            return False
+        if version != USAGE_VERSION or root != self.root:
+            return False
+        self.dirs = dirs
+        self.sum_totals()
+        return True
+
+    def save(self):
+        temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump((USAGE_VERSION, self.root, self.dirs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.file_path)
+
+    def update(self, visit=None, cancelled=None, workers=None):
+        # visit(relpath) is called from the walker's worker threads.
+        previous = self.dirs
+        device = os.stat(self.root).st_dev
+
+        def scan(relpath, path):
+            mtime_ns = os.stat(path).st_mtime_ns
+            cached = previous.get(relpath)
+            if cached is not None and cached[0] == mtime_ns and cached[1] - mtime_ns >= RACY_WINDOW_NS:
+                entry, rescanned = cached, False
+            else:
+                entry, rescanned = scan_directory(path, device, mtime_ns), True
+            if visit is not None:
+                visit(relpath)
+            return (entry, rescanned), entry[4]
+
+        fresh = {}
+        rescanned = 0
+        for relpath, (entry, was_rescanned) in walker.walk(self.root, scan, workers, cancelled):
+            fresh[relpath] = entry
+            rescanned += was_rescanned
+
+        if cancelled is not None and cancelled.is_set():
+            # Folders not reached yet keep their old sizes until next time.
+            if rescanned:
+                self.dirs = {**previous, **fresh}
+                self.sum_totals()
+            return rescanned > 0
+
+        changed = rescanned > 0 or len(fresh) != len(previous)
+        self.dirs = fresh
+        if changed:
+            self.sum_totals()
+        return changed
+
+    def sum_totals(self):
+        # A file with several hard links counts once, like in du: in the
+        # first folder, by path, that links to it.
+        owners = {}
+        for relpath, entry in self.dirs.items():
+            for device, inode, size in entry[5]:
+                owner = owners.get((device, inode))
+                if owner is None or relpath < owner[0]:
+                    owners[(device, inode)] = (relpath, size)
+        linked_bytes = defaultdict(int)
+        for relpath, size in owners.values():
+            linked_bytes[relpath] += size
+        self.link_owners = {key: owner[0] for key, owner in owners.items()}
+
+        totals = {}
+        for relpath in sorted(self.dirs, key=lambda p: p.count(os.sep) + bool(p), reverse=True):
+            _, _, total_bytes, file_count, subdirs, _ = self.dirs[relpath]
+            total_bytes += linked_bytes.get(relpath, 0)
+            dir_count = len(subdirs)
+            for name in subdirs:
+                child = totals.get(os.path.join(relpath, name))
+                if child is not None:
+                    total_bytes += child[0]
+                    file_count += child[1]
+                    dir_count += child[2]
+            totals[relpath] = (total_bytes, file_count, dir_count)
+        self.totals = totals
+
+    def children(self, relpath):
+        # (name, bytes, is_dir) for everything in relpath, biggest first.
+        # Folders come from the totals; files are listed afresh, since a file
+        # that grew leaves its folder's mtime alone. A file with several hard
+        # links shows its size under one name only, the one the totals count,
+        # and 0 bytes under the others, so the rows add up to the total.
+        path = os.path.join(self.root, relpath) if relpath else self.root
+        entry = self.dirs.get(relpath)
+        subdirs = set(entry[4]) if entry is not None else set()
+        found = []
+        seen = set()
+        try:
+            with os.scandir(path) as entries:
+                for child in entries:
+                    try:
+                        if child.name in subdirs:
+                            total = self.totals.get(os.path.join(relpath, child.name))
+                            found.append((child.name, total[0] if total else 0, True))
+                        elif not child.is_dir(follow_symlinks=False):
+                            info = child.stat(follow_symlinks=False)
+                            size = info.st_size
+                            if info.st_nlink > 1 and info.st_ino:
+                                key = (info.st_dev, info.st_ino)
+                                if key in seen or self.link_owners.get(key, relpath) != relpath:
+                                    size = 0
+                                seen.add(key)
+                            found.append((child.name, size, False))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        found.sort(key=lambda child: (-child[1], child[0]))
+        return found
+
+
+def get_tree(root):
+    global _tree
+    root = os.path.abspath(root)
+    with _tree_lock:
+        if _tree is None or _tree.root != root:
+            _tree = UsageTree(root)
+            _tree.load()
+        return _tree
+
+
+class UsageRows(list):
+    # Display labels of the usage view; `children` holds the (name, bytes,
+    # is_dir) behind each, so the file list needs no stat to color them.
+    def __init__(self, labels, children):
+        super().__init__(labels)
+        self.children = children
+
+    def is_dir_at(self, position):
+        return self.children[position][2]
+
+
+class UsageScan:
+    # Supplies the tree for root. A saved one is shown straight away; the
+    # update that follows on a background thread rescans only the folders
+    # that changed, and replaces `tree.totals` when it is done.
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.tree = None
+        self.scanned = 0
+        self.done = False
+        self.error = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _count(self, relpath):
+        self.scanned += 1
+
+    def _run(self):
+        tree = get_tree(self.root)
+        try:
+            with tree.lock:
+                if tree.dirs:
+                    self.tree = tree
+                changed = tree.update(self._count, self._cancelled)
+                if changed:
+                    tree.save()
+                self.tree = tree
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
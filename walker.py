@@ -0,0 +1,65 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+# scandir spends its time waiting on the kernel (and on NFS, the network), so
+# oversubscribing the cores keeps more directory reads in flight at once.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+CANCEL_POLL_SECONDS = 0.1
+
+
+def scan_entries(relpath, path):
+    with os.scandir(path) as entries:
+        entries = list(entries)
+    subdirs = []
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+        except OSError:
+            continue
+    return entries, subdirs
+
+
+def walk(root, scan=scan_entries, workers=None, cancelled=None):
+    # Yields (relpath, result) for every directory under root, in completion
+    # order. scan(relpath, path) runs on a worker thread and returns
+    # (result, subdir_names); each subdirectory it reports is fanned out to
+    # the pool as its own task. Directories whose scan raises OSError are
+    # skipped, like os.walk does.
+    root = os.path.abspath(root)
+    finished = queue.Queue()
+    pool = ThreadPoolExecutor(max_workers=workers or DEFAULT_WORKERS, thread_name_prefix="walker")
+
+    def run(relpath):
+        path = os.path.join(root, relpath) if relpath else root
+        try:
+            finished.put((relpath, scan(relpath, path), None))
+        except BaseException as e:
+            finished.put((relpath, None, e))
+
+    outstanding = 1
+    pool.submit(run, "")
+    try:
+        while outstanding:
+            if cancelled is not None and cancelled.is_set():
+                return
+            try:
+                relpath, outcome, error = finished.get(timeout=CANCEL_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            outstanding -= 1
+
+            if error is not None:
+                if isinstance(error, OSError):
+                    continue
+                raise error
+
+            result, subdirs = outcome
+            for name in subdirs:
+                pool.submit(run, os.path.join(relpath, name))
+                outstanding += 1
+            yield relpath, result
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,256 @@
+import ctypes
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+
+# Events are collected until the directory has been quiet for SETTLE_SECONDS,
+# so a burst such as an rsync into the directory causes a single refresh.
+# A steady stream still refreshes at least every MAX_DELAY_SECONDS.
+SETTLE_SECONDS = 0.1
+MAX_DELAY_SECONDS = 1.0
+# Directories that cannot be watched through inotify are stat'ed this often.
+POLL_SECONDS = 1.0
+# Longest the thread sleeps before noticing close().
+STOP_POLL_SECONDS = 0.25
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Filesystems whose contents can change without this kernel seeing it:
+# network filesystems, and FUSE, whose daemon may serve anything. inotify
+# never reports those changes, so directories on them are polled instead.
+REMOTE_FILESYSTEMS = {
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs",
+    "lustre", "gpfs", "gfs2", "ocfs2", "davfs", "ncpfs", "coda",
+}
+# /proc/mounts writes these characters as octal escapes.
+MOUNT_ESCAPES = {"\\040": " ", "\\011": "\t", "\\012": "\n", "\\134": "\\"}
+
+
+def load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        # libc is already loaded into the process, so there is no need for
+        # ctypes.util.find_library(), whose imports cost more than the rest of
+        # startup put together.
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def read_mounts():
+    # (mount point, filesystem type) pairs, longest mount point first, so
+    # the first one that contains a path is the one it lives on.
+    mounts = []
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8", errors="surrogateescape") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                point = fields[1]
+                for escape, char in MOUNT_ESCAPES.items():
+                    point = point.replace(escape, char)
+                mounts.append((point, fields[2]))
+    except OSError:
+        pass
+    mounts.sort(key=lambda mount: len(mount[0]), reverse=True)
+    return mounts
+
+
+def is_remote(path, mounts):
+    path = os.path.realpath(path)
+    for point, fstype in mounts:
+        if path == point or path.startswith(point.rstrip("/") + "/"):
+            return fstype in REMOTE_FILESYSTEMS or fstype.startswith("fuse")
+    return False
+
+
+def directory_signature(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_ino, info.st_mtime_ns
+
+
+class DirectoryWatcher:
+    # Watches a set of directories on a background thread, through inotify
+    # where the kernel offers it and by polling their mtimes otherwise.
+    # Changed directories are reported through drain(); `live` holds the
+    # directories whose every change is guaranteed to be reported, so
+    # cached data about them can be trusted without re-checking. Directories
+    # on network and FUSE filesystems are polled and never live, since
+    # inotify misses changes made by other hosts.
+
+    def __init__(self):
+        self.live = frozenset()
+        self._libc = load_inotify()
+        self._fd = -1
+        if self._libc is not None:
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        self._wd_paths = {}
+        self._path_wds = {}
+        self._polled = {}
+        self._pending = set()
+        self._first_event = None
+        self._last_event = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def watch(self, paths):
+        # Makes `paths` the watched set. Returns the directories that were not
+        # watched before; anything cached about them predates the watch.
+        paths = {os.path.abspath(path) for path in paths}
+        with self._lock:
+            added = paths - self._path_wds.keys() - self._polled.keys()
+            removed = (self._path_wds.keys() | self._polled.keys()) - paths
+
+            for path in removed:
+                self._polled.pop(path, None)
+                wd = self._path_wds.pop(path, None)
+                if wd is not None and not self._unlink(wd, path):
+                    self._libc.inotify_rm_watch(self._fd, wd)
+
+            mounts = read_mounts() if added and self._fd >= 0 else []
+            for path in added:
+                wd = -1
+                if self._fd >= 0 and not is_remote(path, mounts):
+                    wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+                if wd >= 0:
+                    self._path_wds[path] = wd
+                    self._wd_paths.setdefault(wd, set()).add(path)
+                else:
+                    self._polled[path] = directory_signature(path)
+
+            self.live = frozenset(self._path_wds)
+        return added
+
+    def _unlink(self, wd, path):
+        # Drops path from the watch descriptor; returns True while other
+        # paths (symlinks to the same directory) still share it.
+        paths = self._wd_paths.get(wd, set())
+        paths.discard(path)
+        if paths:
+            return True
+        self._wd_paths.pop(wd, None)
+        return False
+
+    def _mark(self, paths):
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first_event = now
+            self._pending.update(paths)
+            self._last_event = now
+
+    def ready(self):
+        with self._lock:
+            if not self._pending:
+                return False
+            now = time.monotonic()
+            return now - self._last_event >= SETTLE_SECONDS or now - self._first_event >= MAX_DELAY_SECONDS
+
+    def drain(self):
+        # Returns the directories changed since the last drain, once the
+        # current burst of events has settled.
+        if not self.ready():
+            return set()
+        with self._lock:
+            changed, self._pending = self._pending, set()
+        return changed
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        changed = set()
+        offset = 0
+        with self._lock:
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size + name_length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, so any watched directory may have changed.
+                    changed.update(self._path_wds)
+                    continue
+                paths = self._wd_paths.get(wd, ())
+                changed.update(paths)
+                if mask & IN_IGNORED:
+                    # The kernel removed the watch (the directory is gone), so
+                    # the directory falls back to polling.
+                    for path in self._wd_paths.pop(wd, ()):
+                        self._path_wds.pop(path, None)
+                        self._polled[path] = None
+                    self.live = frozenset(self._path_wds)
+        if changed:
+            self._mark(changed)
+
+    def _poll(self):
+        with self._lock:
+            polled = list(self._polled.items())
+        changed = set()
+        for path, signature in polled:
+            current = directory_signature(path)
+            if current != signature:
+                changed.add(path)
+                with self._lock:
+                    if path in self._polled:
+                        self._polled[path] = current
+        if changed:
+            self._mark(changed)
+
+    def _run(self):
+        next_poll = time.monotonic() + POLL_SECONDS
+        while not self._stopped.is_set():
+            timeout = min(STOP_POLL_SECONDS, max(0, next_poll - time.monotonic()))
+            if self._fd >= 0:
+                try:
+                    readable, _, _ = select.select([self._fd], [], [], timeout)
+                except (OSError, ValueError):
+                    return
+                if readable:
+                    self._read_events()
+            else:
+                self._stopped.wait(timeout)
+            if time.monotonic() >= next_poll:
+                self._poll()
+                next_poll = time.monotonic() + POLL_SECONDS
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1